@@ -0,0 +1,131 @@
+"""
+Shared FRED HTTP + Excel helpers for the pull_fred_* scripts.
+
+Each script still runs standalone from the repo root (its folder is on sys.path), so
+`from fred_core import ...` needs no packaging. Everything here is a fix-once helper the
+scripts used to carry as copies: the keep-alive session fredapi is routed through, the
+JSON observations pull with its 429/Retry-After contract, and the row-major xlsx writer.
+"""
+import math
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from fredapi import Fred
+
+# ------------------ HTTP ------------------
+HTTP_TIMEOUT = 60
+FRED_OBS_URL = "https://api.stlouisfed.org/fred/series/observations"
+
+class FredHTTPError(ValueError):
+    """ValueError (as fredapi raises) that also carries the HTTP status and Retry-After seconds."""
+    def __init__(self, msg, status_code=None, retry_after=None):
+        super().__init__(msg)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+def parse_retry_after(value):
+    """Retry-After is either delta-seconds or an HTTP-date; returns seconds or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+def make_session(pool_connections: int, pool_maxsize: int) -> requests.Session:
+    """Keep-alive session; size the pool to the caller's worker count so urllib3 never discards sockets."""
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize))
+    return session
+
+def route_fredapi(session: requests.Session):
+    """
+    fredapi opens a fresh urllib connection per call; swap its private __fetch_data for one
+    that goes through `session` (same XML root / ValueError contract, plus FredHTTPError fields).
+    """
+    def _session_fetch_data(self, url):
+        resp = session.get(url, params={"api_key": self.api_key}, timeout=HTTP_TIMEOUT)
+        try:
+            root = ET.fromstring(resp.content)
+        except ET.ParseError:
+            root = None
+        if not resp.ok:
+            msg = root.get("message") if root is not None else None
+            raise FredHTTPError(
+                msg or f"{resp.status_code} {resp.reason}",
+                status_code=resp.status_code,
+                retry_after=parse_retry_after(resp.headers.get("Retry-After")),
+            )
+        return root
+
+    Fred._Fred__fetch_data = _session_fetch_data
+
+def fetch_observations(session: requests.Session, api_key: str, sid: str, observation_start: str) -> pd.Series:
+    """
+    series/observations as JSON → float64 Series on a DatetimeIndex ("." → NaN rows kept).
+    Replaces fred.get_series, which calls pd.to_datetime once per observation; here dates
+    and values are each one array.
+    """
+    resp = session.get(FRED_OBS_URL, params={
+        "series_id": sid, "observation_start": observation_start,
+        "file_type": "json", "api_key": api_key,
+    }, timeout=HTTP_TIMEOUT)
+    try:
+        payload = resp.json()
+    except ValueError:
+        payload = {}
+    if not resp.ok:
+        raise FredHTTPError(
+            payload.get("error_message") or f"{resp.status_code} {resp.reason}",
+            status_code=resp.status_code,
+            retry_after=parse_retry_after(resp.headers.get("Retry-After")),
+        )
+    obs = payload.get("observations", [])
+    dates = np.array([o["date"] for o in obs], dtype="datetime64[ns]")
+    vals = np.fromiter((np.nan if o["value"] == "." else float(o["value"]) for o in obs),
+                       dtype=np.float64, count=len(obs))
+    return pd.Series(vals, index=pd.DatetimeIndex(dates), name="value")
+
+# ------------------ EXCEL ------------------
+def cell_values(col: pd.Series) -> list:
+    """Column → plain Python cell values for xlsxwriter (NaN/NaT/inf → None = blank cell)."""
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return [None if pd.isna(v) else v.to_pydatetime() for v in col]
+    if pd.api.types.is_numeric_dtype(col) and not pd.api.types.is_bool_dtype(col):
+        vals = col.to_numpy(dtype=np.float64, na_value=np.nan).tolist()
+        return [v if math.isfinite(v) else None for v in vals]
+    out = []
+    for v in col.astype(object).tolist():
+        if v is None or (not isinstance(v, str) and pd.isna(v)):
+            out.append(None)
+        elif isinstance(v, float) and not math.isfinite(v):
+            out.append(None)
+        else:
+            out.append(v)
+    return out
+
+def write_sheet(xw, df: pd.DataFrame, sheet_name: str, index: bool = False):
+    """
+    Row-major replacement for df.to_excel(xw, ...). The workbook runs in xlsxwriter's
+    constant_memory mode, which flushes each row as soon as the next one starts; pandas'
+    to_excel emits cells column by column, so it can't be used with that mode.
+    """
+    if index:
+        df = df.reset_index()
+    ws = xw.book.add_worksheet(sheet_name)
+    header_fmt = xw.book.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+    ws.write_row(0, 0, [str(c) for c in df.columns], header_fmt)
+    cols = [cell_values(df[c]) for c in df.columns] if len(df.columns) else []
+    for r, row in enumerate(zip(*cols), start=1):
+        ws.write_row(r, 0, row)
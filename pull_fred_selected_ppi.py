@@ -1,8 +1,12 @@
 # pull_fred_selected_ppi.py
-import os, time, random, warnings
+import os, json, time, random, hashlib, warnings, threading, functools
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
 from fredapi import Fred
+import fred_core
+from fred_core import make_session, route_fredapi, fetch_observations, write_sheet
 from dateutil.relativedelta import relativedelta
 from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import Pipeline
@@ -16,6 +20,7 @@ warnings.filterwarnings("ignore")
 # ---------------- CONFIG ----------------
 START_DATE          = "2016-01-01"
 BASE_YEAR           = 2019
+BASE_START, BASE_END = pd.Timestamp(BASE_YEAR, 1, 1), pd.Timestamp(BASE_YEAR + 1, 1, 1)
 OUTPUT_XLSX         = "fred_selected_ppi_2019base.xlsx"
 FORECAST_HORIZON    = 12
 TOP_K_EXOG          = 10
@@ -23,6 +28,15 @@ MAX_LAG_MONTHS      = 12
 AR_P                = 6
 CAL_WINDOW_MONTHS   = 18
 MC_SIMS             = 5000
+FETCH_WORKERS       = max(1, int(os.environ.get("FETCH_WORKERS", "6")))  # concurrent FRED pulls
+PAUSE_SECONDS       = 0.15   # min spacing between request starts, shared by all workers
+
+# Observation cache: a series is re-downloaded only when FRED's last_updated changes
+CACHE_DIR           = os.environ.get("CACHE_DIR", "outputs/fred_ppi_cache")
+# Keep the existing workbook (no models/write) when nothing it was built from changed
+SKIP_IF_UNCHANGED   = os.environ.get("SKIP_IF_UNCHANGED", "1") == "1"
+INPUTS_PATH         = Path(OUTPUT_XLSX + ".inputs.json")
+Path(CACHE_DIR).mkdir(parents=True, exist_ok=True)
 
 # Env key
 FRED_API_KEY = os.environ.get("FRED_API_KEY")
@@ -126,7 +140,8 @@ def apply_id_fixups(series_ids):
             print(f"[ID FIXUP] {sid} -> {new_sid}")
         fixed.append(new_sid)
     return fixed
-SERIES_IDS = apply_id_fixups(SERIES_IDS)
+# Re-dedupe: a fixup can map onto an id that is already listed
+SERIES_IDS = list(dict.fromkeys(apply_id_fixups(SERIES_IDS)))
 
 # --------------- DATE HELPERS ---------------
 def to_month_start_index(dt_like):
@@ -143,65 +158,171 @@ def to_month_start_index(dt_like):
     return idx.to_period("M").to_timestamp(how="start")
 
 # --------------- RETRY (surface real error) ---------------
+BASE_BACKOFF = 2.0
+MAX_BACKOFF  = 60.0
+
 def retry_call(func, *args, **kwargs):
+    """
+    Retries keyed on the HTTP status carried by FredHTTPError:
+    - 400/404 (bad ID / bad request): raise at once, retrying can't help.
+    - 429: sleep the server's Retry-After when sent, else capped backoff + jitter.
+    - anything else (5xx, network): capped exponential backoff + jitter.
+    """
     last = None
     for attempt in range(6):
         try:
             return func(*args, **kwargs)
         except Exception as e:
             last = e
-            time.sleep(2.0 * (2**attempt) + random.uniform(0, 1.0))
+            status = getattr(e, "status_code", None)
+            if status in (400, 404):
+                break
+            retry_after = getattr(e, "retry_after", None) if status == 429 else None
+            if retry_after is None:
+                retry_after = min(MAX_BACKOFF, BASE_BACKOFF * (2**attempt)) * (1 + random.random() * 0.25)
+            time.sleep(retry_after)
     raise last
 
+# ---------------- HTTP (keep-alive session) ----------------
+# fredapi is routed through one pooled requests.Session (fred_core.route_fredapi), so
+# TCP/TLS setup is paid once per worker, not once per request.
+SESSION = make_session(pool_connections=FETCH_WORKERS, pool_maxsize=FETCH_WORKERS * 2)
+route_fredapi(SESSION)
+
+def get_observations(sid: str, observation_start: str = START_DATE) -> pd.Series:
+    """fred_core.fetch_observations on this run's session and key."""
+    return fetch_observations(SESSION, FRED_API_KEY, sid, observation_start)
+
 # ---------------- PRE-FLIGHT (auth/connectivity) ----------------
 fred = Fred(api_key=FRED_API_KEY)
 try:
-    _probe = fred.get_series("CPIAUCSL", observation_start="2019-01-01")
+    _probe = get_observations("CPIAUCSL", observation_start="2019-01-01")
     assert _probe is not None and len(_probe) > 0
 except Exception as e:
     raise RuntimeError(f"FRED probe failed: {e}. Check FRED_API_KEY & network.") from e
 
-# ---------------- DATA PULL (robust, month-start index, failure summary) ----------------
-records, latest_rows, failed, meta_rows = [], [], [], []
-for i, sid in enumerate(SERIES_IDS, start=1):
+# ---------------- DATA PULL (concurrent, month-start index, failure summary) ----------------
+_pace_lock = threading.Lock()
+_next_start = 0.0
+
+def polite_pause():
+    """Space request starts by PAUSE_SECONDS across all worker threads."""
+    global _next_start
+    with _pace_lock:
+        delay = _next_start - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        _next_start = time.monotonic() + PAUSE_SECONDS
+
+def _cache_path(sid: str) -> Path:
+    return Path(CACHE_DIR) / f"{sid}.csv"
+
+def _cache_meta_path(sid: str) -> Path:
+    return Path(CACHE_DIR) / f"{sid}.meta.json"
+
+def load_cached(sid: str, last_updated: str):
+    """Cached observations if saved under the same last_updated and START_DATE, else None."""
+    if not last_updated or not _cache_path(sid).exists():
+        return None
     try:
-        # (optional) series title
-        try:
-            info = retry_call(fred.get_series_info, sid)
-            meta_rows.append({"FRED_Code": sid, "Title": getattr(info, "title", sid)})
-        except Exception as me:
-            meta_rows.append({"FRED_Code": sid, "Title": sid})
-            print(f"[META WARN] {sid}: {type(me).__name__}: {me}")
-
-        s = retry_call(fred.get_series, sid, observation_start=START_DATE)
-        if s is None or len(s) == 0:
-            failed.append({"FRED_Code": sid, "Reason": "Empty or None from FRED"})
-            continue
+        meta = json.loads(_cache_meta_path(sid).read_text(encoding="utf-8"))
+        if meta.get("last_updated") != last_updated or meta.get("observation_start") != START_DATE:
+            return None
+        df = pd.read_csv(_cache_path(sid), parse_dates=["date"])
+        return df.set_index("date")["value"]
+    except Exception:
+        return None
 
-        df = s.to_frame("value").reset_index().rename(columns={"index": "date"})
-        df["date"] = to_month_start_index(df["date"])
+def save_cached(sid: str, s: pd.Series, last_updated: str):
+    if not last_updated:
+        return
+    try:
+        pd.DataFrame({"date": s.index.to_numpy(), "value": s.to_numpy()}).to_csv(_cache_path(sid), index=False)
+        _cache_meta_path(sid).write_text(
+            json.dumps({"last_updated": last_updated, "observation_start": START_DATE}),
+            encoding="utf-8",
+        )
+    except Exception:
+        pass
 
-        base = df.loc[df["date"].dt.year == BASE_YEAR, "value"].mean()
-        df["index_2019=100"] = (df["value"] / base) * 100.0 if pd.notna(base) and base != 0 else pd.NA
-        df["series_id"] = sid
+def pull_one(sid: str) -> dict:
+    """Pool worker: title + raw observations for one id → {"meta", "s"} or {"meta", "reason"}."""
+    # (optional) series title; last_updated keys the observation cache
+    last_updated = ""
+    try:
+        polite_pause()
+        info = retry_call(fred.get_series_info, sid)
+        meta = {"FRED_Code": sid, "Title": getattr(info, "title", sid)}
+        last_updated = str(getattr(info, "last_updated", "") or "")
+    except Exception as me:
+        meta = {"FRED_Code": sid, "Title": sid}
+        print(f"[META WARN] {sid}: {type(me).__name__}: {me}")
 
-        title = next((m["Title"] for m in meta_rows if m["FRED_Code"] == sid), sid)
-        df["series_label"] = title
+    try:
+        s = load_cached(sid, last_updated)
+        if s is None:
+            polite_pause()
+            s = retry_call(get_observations, sid)
+            if s is not None and len(s):
+                save_cached(sid, s, last_updated)
+        if s is None or len(s) == 0:
+            return {"meta": meta, "last_updated": last_updated, "reason": "Empty or None from FRED"}
+        return {"meta": meta, "last_updated": last_updated, "s": s}
+    except Exception as e:
+        return {"meta": meta, "last_updated": last_updated, "reason": f"{type(e).__name__}: {e}"}
 
-        records.append(df)
-        latest_rows.append({"FRED_Code": sid, "Latest Available": df["date"].max()})
+records, latest_rows, failed, meta_rows = [], [], [], []
+last_updated_by_sid = {}
+with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as ex:
+    # map() yields in SERIES_IDS order, so every output table keeps the serial layout
+    for i, (sid, res) in enumerate(zip(SERIES_IDS, ex.map(pull_one, SERIES_IDS)), start=1):
+        meta_rows.append(res["meta"])
+        last_updated_by_sid[sid] = res["last_updated"]
+        if "s" in res:
+            s = res["s"]
+            dates = to_month_start_index(s.index)
+            vals = s.to_numpy(dtype=float)
+            # date-ascending per series (FRED's order already): base-year slicing below uses searchsorted
+            if not dates.is_monotonic_increasing:
+                order = dates.argsort(kind="stable")
+                dates, vals = dates[order], vals[order]
+            records.append((sid, res["meta"]["Title"], dates.to_numpy(), vals))
+            latest_rows.append({"FRED_Code": sid, "Latest Available": dates.max()})
+        else:
+            failed.append({"FRED_Code": sid, "Reason": res["reason"]})
 
         if i % 10 == 0:
             print(f"...pulled {i}/{len(SERIES_IDS)} series")
 
-    except Exception as e:
-        failed.append({"FRED_Code": sid, "Reason": f"{type(e).__name__}: {e}"})
-    finally:
-        time.sleep(0.15)
-
 meta_df   = pd.DataFrame(meta_rows) if meta_rows else pd.DataFrame(columns=["FRED_Code","Title"])
-long_df   = (pd.concat(records, ignore_index=True).sort_values(["series_id","date"])
-             if records else pd.DataFrame(columns=["date","value","index_2019=100","series_id","series_label"]))
+if records:
+    # Ids sorted up front (each record is date-ascending), so long_df comes out in
+    # (series_id, date) order with no frame-wide sort
+    records.sort(key=lambda r: r[0])
+    # One constructor call for every series instead of N per-series frames + concat
+    lengths = [len(r[2]) for r in records]
+    long_df = pd.DataFrame({
+        "date": np.concatenate([r[2] for r in records]),
+        "value": np.concatenate([r[3] for r in records]),
+        # categorical id/label: one small code per row instead of a Python str object
+        "series_id": pd.Categorical(np.repeat([r[0] for r in records], lengths)),
+        "series_label": pd.Categorical(np.repeat([r[1] for r in records], lengths)),
+    })
+    # 2019 base per series on its raw arrays (NaN-skipping mean, summed exactly as
+    # Series.mean does), broadcast back with one repeat; no per-series frames.
+    # Dates are sorted, so the base year is one contiguous slice found by binary search.
+    base_bounds = np.array([BASE_START, BASE_END], dtype="datetime64[ns]")
+    bases = np.full(len(records), np.nan)
+    for k, (_, _, dates, vals) in enumerate(records):
+        lo, hi = dates.searchsorted(base_bounds)
+        v = vals[lo:hi]
+        n = np.count_nonzero(~np.isnan(v))
+        if n:
+            bases[k] = np.nan_to_num(v).sum() / n
+    bases[bases == 0] = np.nan
+    long_df.insert(2, "index_2019=100", long_df["value"].to_numpy() / np.repeat(bases, lengths) * 100.0)
+else:
+    long_df = pd.DataFrame(columns=["date","value","index_2019=100","series_id","series_label"])
 latest_df = (
     pd.DataFrame(latest_rows).sort_values("Latest Available", ascending=False)
     if latest_rows else
@@ -209,19 +330,47 @@ latest_df = (
 )
 failed_df = pd.DataFrame(failed).sort_values("FRED_Code") if failed else pd.DataFrame(columns=["FRED_Code","Reason"])
 
-wide_idx = long_df.pivot_table(index="date", columns="series_id", values="index_2019=100", aggfunc="last").sort_index()
-
 if long_df.empty:
     print("\n[ERROR] No series pulled. Summary of failures:")
     if not failed_df.empty:
         print(failed_df.head(20).to_string(index=False))
     raise RuntimeError("No series pulled from FRED. See failure summary above.")
 
+# series_id×date is unique per pull, so a plain pivot (no aggregation) suffices; dropping
+# all-NaN rows/columns matches what pivot_table(aggfunc="last") produced
+wide_idx = (
+    long_df.drop_duplicates(["series_id", "date"], keep="last")
+    .pivot(index="date", columns="series_id", values="index_2019=100")
+    .dropna(axis=1, how="all")
+    .dropna(axis=0, how="all")
+    .sort_index()
+)
+
 print(f"\n[OK] Pulled {len(records)} / {len(SERIES_IDS)} series.")
 if not failed_df.empty:
     print(f"[WARN] {len(failed_df)} series failed. Top examples:")
     print(failed_df.head(10).to_string(index=False))
 
+# ---------------- SKIP WHEN INPUTS UNCHANGED ----------------
+# The workbook is a function of this script, the run knobs and each series' FRED
+# last_updated; if all match the previous complete run, its output is still current.
+inputs = {
+    # fred_core.py holds the fetch and xlsx-writer helpers, so it is part of "the script"
+    "script": hashlib.sha1(Path(__file__).read_bytes() + Path(fred_core.__file__).read_bytes()).hexdigest(),
+    "config": [START_DATE, BASE_YEAR, FORECAST_HORIZON, TOP_K_EXOG, MAX_LAG_MONTHS, AR_P,
+               CAL_WINDOW_MONTHS, MC_SIMS],
+    "series": last_updated_by_sid,
+}
+if (SKIP_IF_UNCHANGED and failed_df.empty and Path(OUTPUT_XLSX).exists()
+        and all(last_updated_by_sid.values())):
+    try:
+        unchanged = json.loads(INPUTS_PATH.read_text(encoding="utf-8")) == inputs
+    except Exception:
+        unchanged = False
+    if unchanged:
+        print(f"[OK] No FRED updates since the last run; keeping {OUTPUT_XLSX}.")
+        raise SystemExit(0)
+
 # ---------------- FEATURE / EXPLAIN HELPERS ----------------
 def best_lag_table(y: pd.Series, X: pd.DataFrame, max_lag: int = 12) -> pd.DataFrame:
     rows = []
@@ -327,6 +476,16 @@ def ridge_contributions(pipeline: Pipeline, X_rows: pd.DataFrame) -> tuple[pd.Da
     pred = contrib_df.sum(axis=1) + intercept
     return contrib_df, pred
 
+@functools.lru_cache(maxsize=4)
+def _mc_std_normals(h: int) -> np.ndarray:
+    """
+    (MC_SIMS, h) standard normals, row s drawn from seed 42+s as the per-sim loop did;
+    scaled by each target's resid_std, so one draw serves every target's fan.
+    """
+    if MC_SIMS <= 0:
+        return np.empty((0, h))
+    return np.stack([np.random.default_rng(42 + s).standard_normal(h) for s in range(MC_SIMS)])
+
 # ---------------- FORECAST PIPELINE ----------------
 NORTH_STARS = [
     ("PCU4841214841212",  "TL"),
@@ -470,16 +629,12 @@ for TARGET, TSHORT in NORTH_STARS:
     print(top_contrib.to_string(index=False))
 
     # --- Monte Carlo bands (same as before) ---
-    sim_paths = []
+    # All sims as one (MC_SIMS, H) array: point path + resid_std × cached normals
     resid_std = stack_df["actual"].sub(stack_fit_cal.reindex(stack_df.index)).std(ddof=1) if not stack_df.empty else 0.0
-    for s in range(MC_SIMS):
-        noise = np.random.default_rng(42 + s).normal(loc=0.0, scale=resid_std or 0.0, size=len(stack_fcst))
-        sim_paths.append((stack_fcst.values + noise).astype(float))
-    if sim_paths:
-        sim_df = pd.DataFrame(sim_paths, index=[f"sim_{i}" for i in range(MC_SIMS)]).T
-        q_df = sim_df.quantile([0.05, 0.10, 0.50, 0.90, 0.95], axis=1).T
-        q_df.columns = ["p05", "p10", "p50", "p90", "p95"]
-        q_df.index = stack_fcst.index
+    if MC_SIMS > 0:
+        sim_paths = stack_fcst.to_numpy(dtype=float) + (resid_std or 0.0) * _mc_std_normals(len(stack_fcst))
+        q = np.quantile(sim_paths, [0.05, 0.10, 0.50, 0.90, 0.95], axis=0).T
+        q_df = pd.DataFrame(q, index=stack_fcst.index, columns=["p05", "p10", "p50", "p90", "p95"])
     else:
         q_df = pd.DataFrame(index=stack_fcst.index, columns=["p05", "p10", "p50", "p90", "p95"], dtype=float)
 
@@ -512,38 +667,43 @@ for TARGET, TSHORT in NORTH_STARS:
     print(leaderboard)
 
 # ---------------- WRITE EXCEL ----------------
-with pd.ExcelWriter(OUTPUT_XLSX, engine="xlsxwriter") as xw:
-    long_df.to_excel(xw, sheet_name="Series_Long", index=False)
-    wide_idx.to_excel(xw, sheet_name="Wide_Index2019")
-    meta_df.to_excel(xw, sheet_name="Metadata", index=False)
+excel_options = {"constant_memory": True, "default_date_format": "yyyy-mm-dd", "strings_to_urls": False}
+# Written to a temp file and swapped in, so a crash mid-write never leaves a truncated workbook
+tmp_xlsx = str(Path(OUTPUT_XLSX).with_suffix(".tmp.xlsx"))
+with pd.ExcelWriter(tmp_xlsx, engine="xlsxwriter", engine_kwargs={"options": excel_options}) as xw:
+    write_sheet(xw, long_df, "Series_Long")
+    write_sheet(xw, wide_idx, "Wide_Index2019", index=True)
+    write_sheet(xw, meta_df, "Metadata")
     if not failed_df.empty:
-        failed_df.to_excel(xw, sheet_name="Failed", index=False)
+        write_sheet(xw, failed_df, "Failed")
     if not latest_df.empty:
-        latest_df.to_excel(xw, sheet_name="Latest_Available", index=False)
+        write_sheet(xw, latest_df, "Latest_Available")
 
     for TSHORT, pack in results.items():
         # Forecasts & leaderboard
-        pack["forecast_table"].reset_index().rename(columns={"index": "date"}).to_excel(
-            xw, sheet_name=f"Forecast_{TSHORT}", index=False
-        )
-        pack["leaderboard"].to_excel(xw, sheet_name=f"Leaderboard_{TSHORT}", index=False)
+        write_sheet(xw, pack["forecast_table"].rename_axis("date"), f"Forecast_{TSHORT}", index=True)
+        write_sheet(xw, pack["leaderboard"], f"Leaderboard_{TSHORT}")
 
         # NEW: correlations (abs r ranked)
         if "correlations" in pack:
             corr_df = pack["correlations"].copy()
             corr_df["abs_r"] = corr_df["pearson"].abs()
             corr_df.sort_values("abs_r", ascending=False, inplace=True)
-            corr_df.to_excel(xw, sheet_name=f"Corr_{TSHORT}", index=False)
+            write_sheet(xw, corr_df, f"Corr_{TSHORT}")
 
         # NEW: explain table (coeffs + contributions)
         if "explain" in pack:
-            pack["explain"].to_excel(xw, sheet_name=f"Explain_{TSHORT}", index=False)
+            write_sheet(xw, pack["explain"], f"Explain_{TSHORT}")
 
         # NEW: per-month contributions matrix (optional, for audit)
         if "ridge_contrib" in pack:
-            contrib_w = pack["ridge_contrib"].copy()
-            contrib_w.reset_index().rename(columns={"index":"date"}).to_excel(
-                xw, sheet_name=f"Contrib_{TSHORT}", index=False
-            )
+            write_sheet(xw, pack["ridge_contrib"].rename_axis("date"), f"Contrib_{TSHORT}", index=True)
+
+os.replace(tmp_xlsx, OUTPUT_XLSX)
+# Only a complete run is a valid baseline for skipping; failed ids must be retried next time
+if failed_df.empty:
+    INPUTS_PATH.write_text(json.dumps(inputs), encoding="utf-8")
+else:
+    INPUTS_PATH.unlink(missing_ok=True)
 
 print(f"\n✅ Saved {OUTPUT_XLSX} with forecasts + backtests + explainability tabs")
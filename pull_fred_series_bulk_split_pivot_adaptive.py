@@ -1,11 +1,17 @@
 # pull_fred_series_bulk_split_pivot_adaptive.py
-import os, re, time, random
+import os, re, io, json, time, random, hashlib, functools, threading
 import datetime as dt
 from datetime import timezone # FIX: Import timezone
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np 
 from fredapi import Fred
+import fred_core
+from fred_core import (
+    HTTP_TIMEOUT, FredHTTPError, parse_retry_after,
+    make_session, route_fredapi, fetch_observations, write_sheet,
+)
 from statsmodels.tsa.holtwinters import ExponentialSmoothing 
 from dateutil.relativedelta import relativedelta 
 import warnings 
@@ -17,9 +23,11 @@ t0 = time.time()
 # ------------------ CONFIG ------------------
 START_DATE = "2016-01-01"
 BASE_YEAR = 2019
+BASE_START, BASE_END = pd.Timestamp(BASE_YEAR, 1, 1), pd.Timestamp(BASE_YEAR + 1, 1, 1)
 OUTPUT_XLSX = "fred_series_2019base_with_forecasts.xlsx" 
 FORECAST_HORIZON = 12 
 MC_SIMS = 5000 # Number of simulations for p05/p95 bands
+MAX_TRAIN = int(os.environ.get("MAX_TRAIN", "120")) # ETS fits on the last N months only (0 = all); sheets keep full history
 
 # ---------- Pull controls (env-configurable) ----------
 PULL_MODE = os.environ.get("PULL_MODE", "FULL").upper() 
@@ -28,10 +36,26 @@ SERIES_ALLOWLIST = [
     s.strip().upper() for s in os.environ.get("SERIES_ALLOWLIST", "").split(",")
     if s.strip() 
 ]
-
-# Simple CSV cache (skip re-pull if fresher than TTL days)
+# Concurrent FRED requests; request starts are still spaced by the shared pacer
+FETCH_WORKERS = max(1, int(os.environ.get("FETCH_WORKERS", "8")))
+# Pull observations via fredgraph.csv (same-family/same-frequency ids batched, the rest
+# one id per request); anything it doesn't return falls back to the per-series API call
+BATCH_CSV = os.environ.get("BATCH_CSV", "1") == "1"
+# Keep the existing workbook (no pull/forecast/write) when nothing it was built from changed
+SKIP_IF_UNCHANGED = os.environ.get("SKIP_IF_UNCHANGED", "1") == "1"
+INPUTS_PATH = Path(OUTPUT_XLSX + ".inputs.json")
+FREDGRAPH_CSV_URL = "https://fred.stlouisfed.org/graph/fredgraph.csv"
+BATCH_MAX_IDS = 40
+BATCH_MAX_ID_CHARS = 1800 # keep the request URL under ~2000 chars
+
+# Simple CSV cache: reuse when FRED's last_updated is unchanged, else fall back to TTL days
 CACHE_DIR = os.environ.get("CACHE_DIR", "outputs/fred_cache")
 CACHE_TTL_DAYS = int(os.environ.get("CACHE_TTL_DAYS", "7"))
+# Curated (already-labelled) ids may reuse their saved /series metadata for this long
+# instead of re-requesting it (0 = always re-request, the default). Only the static fields
+# are reused: last_updated is what keys the observation cache and the unchanged-input
+# skip, so a reused row has none, and the reuse is off entirely under SKIP_IF_UNCHANGED.
+META_TTL_HOURS = float(os.environ.get("META_TTL_HOURS", "0")) if not SKIP_IF_UNCHANGED else 0.0
 Path(CACHE_DIR).mkdir(parents=True, exist_ok=True)
 
 # ------------------ ENV / FRED ------------------
@@ -40,45 +64,77 @@ if not FRED_API_KEY:
     raise RuntimeError("FRED_API_KEY env var not set (define it in GitHub Secrets or your shell).")
 fred = Fred(api_key=FRED_API_KEY)
 
+# fredapi is routed through one keep-alive requests.Session (fred_core.route_fredapi),
+# so TCP/TLS setup is paid once per run instead of once per series.
+# One pooled socket per host per worker (api. and fred.stlouisfed.org): a pool smaller than
+# FETCH_WORKERS makes urllib3 discard connections and re-handshake under load.
+SESSION = make_session(pool_connections=2, pool_maxsize=FETCH_WORKERS)
+route_fredapi(SESSION)
+
+def get_observations(sid: str, observation_start: str = START_DATE) -> pd.Series:
+    """fred_core.fetch_observations on this run's session and key."""
+    return fetch_observations(SESSION, FRED_API_KEY, sid, observation_start)
+
 # ------------------ Adaptive Pacing ------------------
 MIN_PAUSE = 0.50 
 MAX_PAUSE = 2.50 
-STEP_UP_MULT = 1.5 
-STEP_DOWN_MULT = 0.90 
+RATE_CUT = 0.5        # AIMD: on a 429 the request rate is multiplied by this...
+RATE_STEP_UP = 0.10   # ...and after each clean streak it grows by this many req/s
 SUCCESS_STREAK = 25 
 BASE_BACKOFF = 2.0 
 MAX_RETRIES_PER_CALL = 6
-COOLDOWN_EVERY_N_CALLS = 120
-COOLDOWN_SECONDS = 12
+FRED_REQS_PER_MIN = 120  # documented FRED API quota per key
+BUCKET_CAPACITY = 10     # burst size; refill is capped so any 60s window stays within the quota
 
 class AdaptivePacer:
+    """
+    Token bucket shared across fetch workers. Tokens refill at 1/pause per second (capped so
+    BUCKET_CAPACITY + a minute of refill never exceeds FRED_REQS_PER_MIN); `sleep` takes one
+    and only waits when the bucket is empty. The rate (1/pause) adapts AIMD-style: cut by
+    RATE_CUT on a 429 (which also drains the bucket), +RATE_STEP_UP req/s after
+    SUCCESS_STREAK clean calls.
+    """
     def __init__(self, pause=MIN_PAUSE):
         self.pause = pause
         self.successes = 0
-        self.calls = 0
+        self.tokens = float(BUCKET_CAPACITY)
+        self.last_refill = time.monotonic()
+        self._gate = threading.Lock()   # guards the bucket; serializes waits for a token
+        self._state = threading.Lock()  # guards pause/successes
+
+    def _refill(self):
+        now = time.monotonic()
+        rate = min(1.0 / self.pause, (FRED_REQS_PER_MIN - BUCKET_CAPACITY) / 60.0)
+        self.tokens = min(BUCKET_CAPACITY, self.tokens + (now - self.last_refill) * rate)
+        self.last_refill = now
+        return rate
 
     def sleep(self):
-        jitter = random.uniform(0, 0.12)
-        time.sleep(self.pause + jitter)
-        self.calls += 1
-        if COOLDOWN_EVERY_N_CALLS and self.calls % COOLDOWN_EVERY_N_CALLS == 0:
-            print(f"!! Cooldown: sleeping {COOLDOWN_SECONDS}s after {self.calls} calls...")
-            time.sleep(COOLDOWN_SECONDS)
+        with self._gate:
+            rate = self._refill()
+            if self.tokens < 1:
+                time.sleep((1 - self.tokens) / rate + random.uniform(0, 0.05))
+                self._refill()
+            self.tokens -= 1
 
     def on_success(self):
-        self.successes += 1
-        if self.successes >= SUCCESS_STREAK:
-            old = self.pause
-            self.pause = max(MIN_PAUSE, self.pause * STEP_DOWN_MULT)
-            if self.pause < old:
-                print(f">> Easing pace: {old:.2f}s → {self.pause:.2f}s")
-            self.successes = 0
+        with self._state:
+            self.successes += 1
+            if self.successes >= SUCCESS_STREAK:
+                old = self.pause
+                self.pause = max(MIN_PAUSE, 1.0 / (1.0 / self.pause + RATE_STEP_UP))
+                if self.pause < old:
+                    print(f">> Easing pace: {old:.2f}s → {self.pause:.2f}s")
+                self.successes = 0
 
     def on_rate_limit(self):
-        self.successes = 0
-        old = self.pause
-        self.pause = min(MAX_PAUSE, self.pause * STEP_UP_MULT)
-        print(f"!! Rate-limit: pacing {old:.2f}s → {self.pause:.2f}s")
+        with self._state:
+            self.successes = 0
+            old = self.pause
+            self.pause = min(MAX_PAUSE, self.pause / RATE_CUT)
+            print(f"!! Rate-limit: pacing {old:.2f}s → {self.pause:.2f}s")
+        with self._gate:
+            self.tokens = min(self.tokens, 0.0)
 
 pacer = AdaptivePacer()
 
@@ -187,102 +243,54 @@ SERIES = {
     "DGDSRX1": "Real PCE: Goods",
 }
 
-# Long list (kept same as your working file)
-SERIES_IDS_RAW = """
-PCU484121484121
-PCU4841224841221
-PCU482111482111412
-WPU057303
-PCU336120336120
-WPU141302
-WPU02
-BUSINV
-ISRATIO
-WHLSLRSMSA
-RSFSXMV
-RETAILIMSA
-R423IRM163SCEN
-RETAILIRSA
-MRTSSM454USS
-RSAFS
-RSNSR
-IMP0004
-DGDSRX1
-AMTMNO
-NEWORDER
-DGORDER
-PERMIT1
-PERMIT5
-HOUST
-UMCSENT
-IPMANSICS
-IPMAN
-IPB50001N
-IPG316N
-IPG311S
-IPG3113S
-IPG311A2S
-IPG312S
-IPG3112N
-IPG315N
-IPG322S
-IPG323S
-IPG324S
-IPG325S
-IPG326S
-IPG327S
-IPG3273S
-IPG333S
-IPG334S
-IPG335S
-IPG3361T3S
-IPG3363S
-IPG337N
-IPG339N
-IPG332S
-IPG321S
-IPN3311A2RS
-IPN213111S
-IPG3327S
-IPN3328S
-IPG313S
-IPG314S
-CUMFNS
-CAPUTLG3311A2S
-CAPUTLG311S
-CAPUTLG312S
-CAPUTLG325S
-CAPUTLG326S
-MVAAUTLTTS
-HTRUCKSSAAR
-TRUCKD11
-FRGSHPUSM649NCIS
-FRGEXPUSM649NCIS
-CES4300000003
-LNU04032231
-CFNAI
-CFNAIMA3
-""".strip()
+# Long list (kept same as your working file) — ordered, de-duplicated at author time
+SERIES_IDS = (
+    # --- Producer Prices / Freight & Costs ---
+    "PCU484121484121", "PCU4841224841221", "PCU482111482111412", "WPU057303",
+    "PCU336120336120", "WPU141302", "WPU02",
 
-# ------------------ HELPERS ------------------
-def clean_ids(multiline_text: str):
-    lines = [ln.strip().upper() for ln in multiline_text.splitlines()
-             if ln.strip() and not ln.strip().startswith("#")]
-    unique, seen = [], set()
-    for s in lines:
-        if s not in seen:
-            seen.add(s)
-            unique.append(s)
-    dup_count = len(lines) - len(unique)
-    if dup_count:
-        print(f"-> Removed {dup_count} duplicate IDs before pulling.")
-    return unique
+    # --- Retail / Wholesale / Inventories / Imports / PCE ---
+    "BUSINV", "ISRATIO", "WHLSLRSMSA", "RSFSXMV",
+    "RETAILIMSA", "R423IRM163SCEN", "RETAILIRSA", "MRTSSM454USS",
+    "RSAFS", "RSNSR", "IMP0004", "DGDSRX1",
+
+    # --- Orders / Housing / Sentiment ---
+    "AMTMNO", "NEWORDER", "DGORDER", "PERMIT1",
+    "PERMIT5", "HOUST", "UMCSENT",
+
+    # --- Industrial Production (IP) ---
+    "IPMANSICS", "IPMAN", "IPB50001N", "IPG316N",
+    "IPG311S", "IPG3113S", "IPG311A2S", "IPG312S",
+    "IPG3112N", "IPG315N", "IPG322S", "IPG323S",
+    "IPG324S", "IPG325S", "IPG326S", "IPG327S",
+    "IPG3273S", "IPG333S", "IPG334S", "IPG335S",
+    "IPG3361T3S", "IPG3363S", "IPG337N", "IPG339N",
+    "IPG332S", "IPG321S", "IPN3311A2RS", "IPN213111S",
+    "IPG3327S", "IPN3328S", "IPG313S", "IPG314S",
+
+    # --- Capacity Utilization ---
+    "CUMFNS", "CAPUTLG3311A2S", "CAPUTLG311S", "CAPUTLG312S",
+    "CAPUTLG325S", "CAPUTLG326S",
+
+    # --- Vehicles / Assemblies ---
+    "MVAAUTLTTS", "HTRUCKSSAAR",
+
+    # --- Freight / Transport ---
+    "TRUCKD11", "FRGSHPUSM649NCIS", "FRGEXPUSM649NCIS",
 
+    # --- Labor / Wages ---
+    "CES4300000003", "LNU04032231",
+
+    # --- Leads ---
+    "CFNAI", "CFNAIMA3",
+)
+
+# ------------------ HELPERS ------------------
 def retry_call(func, *args, **kwargs):
     """
-    Retries with exponential backoff + jitter.
-    - Hard-fail immediately on 'does not exist' (bad ID).
-    - Backoff on 429/rate-limit.
+    Retries with exponential backoff + jitter, keyed on the HTTP status.
+    - Hard-fail immediately on 400/404 (bad ID: "The series does not exist").
+    - Backoff on 429; sleeps exactly the server's Retry-After when sent.
     """
     last_err = None
     for attempt in range(1, MAX_RETRIES_PER_CALL + 1):
@@ -292,15 +300,18 @@ def retry_call(func, *args, **kwargs):
             return result
         except Exception as e:
             last_err = e
-            msg = str(e).lower()
+            status = getattr(e, "status_code", None)
 
-            # --- PATCH: Hard-fail only on "does not exist" ---
-            if "does not exist" in msg:
+            if status in (400, 404):
                 break
 
-            if "too many requests" in msg or "429" in msg or "rate limit" in msg:
+            if status == 429:
                 pacer.on_rate_limit()
-                wait = BASE_BACKOFF * (2 ** (attempt - 1)) + random.uniform(0, 1.0)
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after is not None:
+                    wait = retry_after
+                else:
+                    wait = BASE_BACKOFF * (2 ** (attempt - 1)) + random.uniform(0, 1.0)
                 print(f"!! Rate limit hit. Backing off {wait:.1f}s (attempt {attempt}/{MAX_RETRIES_PER_CALL})...")
                 time.sleep(wait)
             else:
@@ -330,39 +341,218 @@ def get_series_info_safe(sid: str):
     except Exception as e:
         return {"FRED_Code": sid, "Title": sid, "Notes": f"(metadata error: {e})"}
 
+_FAMILY_RE = re.compile(r"^[A-Z]+")
+
+@functools.lru_cache(maxsize=None)
 def series_family(sid: str) -> str:
-    m = re.match(r"^[A-Z]+", sid)
+    m = _FAMILY_RE.match(sid)
     return m.group(0) if m else sid
 
+def _fetch_info(sid: str):
+    """
+    Pool worker, one pass per id: metadata (saved static fields for curated ids while
+    within META_TTL_HOURS, else a paced call), then the cache lookup its last_updated
+    unlocks → (meta_row, fresh cached Series or None).
+    """
+    info = _load_info_if_fresh(sid) if sid in SERIES else None
+    if info is None:
+        polite_pause()
+        info = get_series_info_safe(sid)
+        if "Last_Updated" in info:
+            _save_info(sid, info)
+    return info, _load_cache_if_fresh(sid, str(info.get("Last_Updated") or ""))
+
+def _fetch_series(sid: str, last_updated: str = "", prefetched: dict = None, cached: pd.Series = None) -> pd.Series:
+    """
+    Pool worker: cached observations if still current, else the batch result, else a paced
+    single-id fredgraph.csv pull, else the JSON observations call.
+    """
+    s = cached if cached is not None else _load_cache_if_fresh(sid, last_updated)
+    if s is None and prefetched and sid in prefetched:
+        s = prefetched[sid]
+        _save_cache(sid, s, last_updated)
+    if s is None and BATCH_CSV:
+        polite_pause()
+        s = _fetch_fredgraph_single(sid)
+        if s is not None:
+            _save_cache(sid, s, last_updated)
+    if s is None:
+        polite_pause()
+        s = retry_call(get_observations, sid)
+        _save_cache(sid, s, last_updated)
+    return s
+
+def _batch_ids(sids, freq_by_sid):
+    """
+    Group ids by (family, frequency) so one fredgraph.csv request never mixes
+    frequencies, then chunk each group by BATCH_MAX_IDS / BATCH_MAX_ID_CHARS.
+    Singletons and ids with unknown frequency are left to the per-series API path.
+    """
+    groups = {}
+    for sid in sids:
+        freq = freq_by_sid.get(sid)
+        if freq:
+            groups.setdefault((series_family(sid), freq), []).append(sid)
+    batches = []
+    for ids in groups.values():
+        if len(ids) < 2:
+            continue
+        cur, chars = [], 0
+        for sid in ids:
+            if cur and (len(cur) >= BATCH_MAX_IDS or chars + len(sid) + 1 > BATCH_MAX_ID_CHARS):
+                batches.append(cur)
+                cur, chars = [], 0
+            cur.append(sid)
+            chars += len(sid) + 1
+        if cur:
+            batches.append(cur)
+    return batches
+
+def _parse_fredgraph_csv(content: bytes, sids) -> dict:
+    """
+    fredgraph.csv body → {sid: Series} for the requested ids, trimmed to START_DATE (C-engine parse).
+    Missing observations stay as NaN rows, as in get_observations. A multi-id file is the
+    outer join of its series' dates, so there each series is also cut to its own first..last
+    observation (the join's padding); gaps inside that span are kept.
+    """
+    # "." is FRED's missing marker; float64 hints skip dtype inference on the value columns
+    df = pd.read_csv(io.BytesIO(content), na_values=["."], dtype={sid: "float64" for sid in sids})
+    # First column is the date ("observation_date"; older files used "DATE"), always ISO
+    dates = pd.to_datetime(df.iloc[:, 0], format="%Y-%m-%d")
+    keep = (dates >= pd.Timestamp(START_DATE)).to_numpy()
+    out = {}
+    for sid in sids:
+        if sid not in df.columns:
+            continue
+        vals = df[sid].to_numpy(dtype=float)[keep]
+        idx = pd.DatetimeIndex(dates[keep])
+        valid = np.flatnonzero(~np.isnan(vals))
+        if valid.size == 0:
+            continue  # nothing usable: leave it to the observations API
+        if len(sids) > 1:
+            span = slice(valid[0], valid[-1] + 1)
+            vals, idx = vals[span], idx[span]
+        out[sid] = pd.Series(vals, index=idx, name="value")
+    return out
+
+def _fredgraph_get(params: dict) -> bytes:
+    """GET fredgraph.csv; HTTP errors raise FredHTTPError so retry_call can back off on 429."""
+    resp = SESSION.get(FREDGRAPH_CSV_URL, params=params, timeout=HTTP_TIMEOUT)
+    if not resp.ok:
+        raise FredHTTPError(
+            f"{resp.status_code} {resp.reason}",
+            status_code=resp.status_code,
+            retry_after=parse_retry_after(resp.headers.get("Retry-After")),
+        )
+    return resp.content
+
+def _fetch_fredgraph_batch(sids) -> dict:
+    """Pool worker: one fredgraph.csv request for several ids → {sid: Series}; {} on any failure."""
+    try:
+        polite_pause()
+        return _parse_fredgraph_csv(_fredgraph_get({"id": ",".join(sids)}), sids)
+    except Exception as e:
+        print(f"!! fredgraph batch failed ({len(sids)} ids, falling back to API): {e}")
+        return {}
+
+def _fetch_fredgraph_single(sid: str):
+    """
+    One id via fredgraph.csv from START_DATE; None if it can't be used. Single attempt:
+    the observations-API fallback carries the retry/backoff, a 429 here just slows the pacer.
+    """
+    try:
+        return _parse_fredgraph_csv(_fredgraph_get({"id": sid, "cosd": START_DATE}), [sid]).get(sid)
+    except Exception as e:
+        if getattr(e, "status_code", None) == 429:
+            pacer.on_rate_limit()
+        return None
+
 def _cache_path(sid: str) -> Path:
     return Path(CACHE_DIR) / f"{sid}.csv"
 
-def _load_cache_if_fresh(sid: str):
+def _cache_meta_path(sid: str) -> Path:
+    return Path(CACHE_DIR) / f"{sid}.meta.json"
+
+def _info_path(sid: str) -> Path:
+    return Path(CACHE_DIR) / f"{sid}.info.json"
+
+def _load_info_if_fresh(sid: str):
+    """
+    Static fields of the saved metadata row for `sid` if younger than META_TTL_HOURS, else
+    None. Last_Updated is blanked: FRED may have revised the series since it was saved, so
+    the observation cache falls back to its age check (CACHE_TTL_DAYS) for this id.
+    """
+    p = _info_path(sid)
+    if META_TTL_HOURS <= 0 or not p.exists():
+        return None
+    if time.time() - p.stat().st_mtime > META_TTL_HOURS * 3600:
+        return None
+    try:
+        info = json.loads(p.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+    info["Last_Updated"] = ""  # unknown this run (kept as a column for the Metadata sheet)
+    return info
+
+def _save_info(sid: str, info: dict):
+    try:
+        _info_path(sid).write_text(json.dumps(info, default=str), encoding="utf-8")
+    except Exception:
+        pass
+
+def _load_cache_if_fresh(sid: str, last_updated: str = ""):
+    """
+    Cached observations for `sid`, or None if a re-pull is needed.
+    - With a known `last_updated`: valid iff the sidecar recorded the same
+      last_updated and START_DATE (FRED hasn't revised the series), regardless of age.
+    - Without one (metadata failed / not fetched): valid if younger than CACHE_TTL_DAYS.
+    """
     p = _cache_path(sid)
     if not p.exists():
         return None
-    
-    now_utc = dt.datetime.now(timezone.utc)
-    file_time_utc = dt.datetime.fromtimestamp(p.stat().st_mtime, timezone.utc)
-    age_days = (now_utc - file_time_utc).days
-    
-    if age_days <= CACHE_TTL_DAYS:
+
+    if last_updated:
         try:
-            df = pd.read_csv(p, parse_dates=["date"])
-            df = df.set_index("date")["value"]
-            return df
+            meta = json.loads(_cache_meta_path(sid).read_text(encoding="utf-8"))
         except Exception:
             return None
-    return None
+        if meta.get("last_updated") != last_updated or meta.get("observation_start") != START_DATE:
+            return None
+    else:
+        now_utc = dt.datetime.now(timezone.utc)
+        file_time_utc = dt.datetime.fromtimestamp(p.stat().st_mtime, timezone.utc)
+        age_days = (now_utc - file_time_utc).days
+        if age_days > CACHE_TTL_DAYS:
+            return None
+
+    try:
+        df = pd.read_csv(p, parse_dates=["date"])
+        df = df.set_index("date")["value"]
+        return df
+    except Exception:
+        return None
 
-def _save_cache(sid: str, s: pd.Series):
+def _save_cache(sid: str, s: pd.Series, last_updated: str = ""):
     try:
-        df = s.to_frame("value").reset_index().rename(columns={"index": "date"})
+        df = pd.DataFrame({"date": s.index.to_numpy(), "value": s.to_numpy()})
         df.to_csv(_cache_path(sid), index=False)
+        _cache_meta_path(sid).write_text(
+            json.dumps({"last_updated": last_updated, "observation_start": START_DATE}),
+            encoding="utf-8",
+        )
     except Exception:
         pass
 
 # ------------------ FORECASTING HELPER (ENHANCED) ------------------
+@functools.lru_cache(maxsize=4096)
+def _future_idx(last_ns: int, horizon: int) -> pd.DatetimeIndex:
+    """Month-start forecast index after `last_ns`; cached since most series end on the same month."""
+    return pd.date_range(
+        pd.Timestamp(last_ns) + relativedelta(months=1),
+        periods=horizon,
+        freq="MS"
+    )
+
 def get_ets_forecast(s: pd.Series, horizon: int, mc_sims: int):
     """
     Generates a robust ETS forecast with Monte Carlo prediction intervals.
@@ -375,9 +565,8 @@ def get_ets_forecast(s: pd.Series, horizon: int, mc_sims: int):
     
     # --- PATCH: Add guard clause for empty series ---
     if s.empty:
-        future_idx = pd.date_range(
-            pd.Timestamp.today().to_period("M").to_timestamp(how="start") + relativedelta(months=1),
-            periods=horizon, freq="MS"
+        future_idx = _future_idx(
+            pd.Timestamp.today().to_period("M").to_timestamp(how="start").value, horizon
         )
         fc_table = pd.DataFrame(index=future_idx)
         fc_table["point_forecast"] = np.nan
@@ -387,34 +576,39 @@ def get_ets_forecast(s: pd.Series, horizon: int, mc_sims: int):
     # --- END PATCH ---
     
     # Create a future index for the forecast
-    future_idx = pd.date_range(
-        s.index[-1] + relativedelta(months=1), 
-        periods=horizon, 
-        freq="MS"
-    )
+    future_idx = _future_idx(s.index[-1].value, horizon)
     
+    # --- Fallback 1: Not enough data, just carry forward ---
+    # Built directly from arrays (future_idx always follows s), no union / .loc writes
+    if len(s) < 24:
+        last_val = s.iloc[-1]
+        hist_nan = np.full(len(s), np.nan)
+        fut_last = np.full(horizon, last_val, dtype=float)
+        fc_col = np.concatenate([hist_nan, fut_last])
+        fc_table = pd.DataFrame(
+            {
+                "actual": np.concatenate([s.to_numpy(dtype=float), np.full(horizon, np.nan)]),
+                "point_forecast": fc_col,
+                "p05": fc_col,
+                "p50": fc_col,
+                "p95": fc_col,
+            },
+            index=s.index.append(future_idx),
+        )
+        point_forecast = pd.Series(fut_last, index=future_idx, name="point_forecast")
+        return point_forecast, fc_table
+
     # --- Create a base table to fill ---
     full_idx = s.index.union(future_idx)
     fc_table = pd.DataFrame(index=full_idx)
     fc_table["actual"] = s.reindex(full_idx)
-    
-    # --- Fallback 1: Not enough data, just carry forward ---
-    if len(s) < 24:
-        last_val = s.iloc[-1] if not s.empty else np.nan
-        fc_table["point_forecast"] = np.nan
-        fc_table.loc[future_idx, "point_forecast"] = last_val
-        # Add bands as just the last_val
-        for q in ["p05", "p50", "p95"]:
-            fc_table[q] = np.nan
-            fc_table.loc[future_idx, q] = last_val
-        
-        point_forecast = fc_table.loc[future_idx, "point_forecast"]
-        return point_forecast, fc_table
 
     # --- Main Model: Try ETS ---
     try:
+        # Fit cost grows with length; 10 seasons are plenty for a 12-month horizon
+        fit_s = s.iloc[-MAX_TRAIN:] if MAX_TRAIN > 0 else s
         model = ExponentialSmoothing(
-            s, 
+            fit_s, 
             trend="add", 
             seasonal="add", 
             seasonal_periods=12
@@ -439,10 +633,8 @@ def get_ets_forecast(s: pd.Series, horizon: int, mc_sims: int):
         elif sims.shape[0] == horizon and sims.shape[1] == mc_sims:
             sims = sims.T
 
-        sims_df = pd.DataFrame(sims, columns=future_idx)
-        quantiles = sims_df.quantile([0.05, 0.50, 0.95]).T
-        quantiles.columns = ["p05", "p50", "p95"]
-        quantiles.index = future_idx
+        q = np.quantile(sims, [0.05, 0.50, 0.95], axis=0).T
+        quantiles = pd.DataFrame(q, index=future_idx, columns=["p05", "p50", "p95"])
 
         fc_table = fc_table.join(quantiles)
         
@@ -461,23 +653,18 @@ def get_ets_forecast(s: pd.Series, horizon: int, mc_sims: int):
         return point_forecast, fc_table
 # ------------------ END HELPER ------------------
 
-
 # ------------------ BUILD FINAL MAP ------------------
-ids_all = clean_ids(SERIES_IDS_RAW)
-final_map = dict(SERIES) # curated labels first
-meta_rows = []
-
-call_counter = 0
-for sid in ids_all:
-    info = get_series_info_safe(sid)
-    meta_rows.append(info)
-    if sid not in final_map:
-        final_map[sid] = info["Title"] or sid
-    call_counter += 1
-    polite_pause()
-    if COOLDOWN_EVERY_N_CALLS and call_counter % COOLDOWN_EVERY_N_CALLS == 0:
-        print(f"!! Cooldown: sleeping {COOLDOWN_SECONDS}s after {call_counter} metadata calls...")
-        time.sleep(COOLDOWN_SECONDS)
+# SERIES_IDS ∪ curated SERIES, once each: every selected id then has a metadata row, so its
+# last_updated drives the cache and the unchanged-input skip
+ids_all = list(dict.fromkeys([*SERIES_IDS, *SERIES]))
+
+with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as ex:
+    info_results = list(ex.map(_fetch_info, ids_all))
+meta_rows = [info for info, _ in info_results]
+cached_by_sid = {sid: cached for sid, (_, cached) in zip(ids_all, info_results) if cached is not None}
+# Curated labels first, then FRED titles for the uncurated ids, in one union
+final_map = {**SERIES, **{sid: info["Title"] or sid
+                          for sid, info in zip(ids_all, meta_rows) if sid not in SERIES}}
 
 # ------- Select IDs to pull based on mode -------
 all_items = list(final_map.items()) # [("SID","Label"), ...]
@@ -496,109 +683,211 @@ if MAX_SERIES and MAX_SERIES > 0:
 
 print(f">> Pull mode: {PULL_MODE} | series selected: {len(all_items)}")
 
+# ------- Skip the rebuild when every input is unchanged -------
+# The workbook is a function of this script, the run knobs and each selected series'
+# FRED last_updated; if all match the previous complete run, its output is still current.
+last_updated_by_sid = {m["FRED_Code"]: str(m.get("Last_Updated") or "") for m in meta_rows}
+inputs = {
+    # fred_core.py holds the fetch and xlsx-writer helpers, so it is part of "the script"
+    "script": hashlib.sha1(Path(__file__).read_bytes() + Path(fred_core.__file__).read_bytes()).hexdigest(),
+    "config": [START_DATE, BASE_YEAR, FORECAST_HORIZON, MC_SIMS, MAX_TRAIN],
+    "series": {sid: [label, last_updated_by_sid.get(sid, "")] for sid, label in all_items},
+}
+if SKIP_IF_UNCHANGED and Path(OUTPUT_XLSX).exists() and all(lu for _, lu in inputs["series"].values()):
+    try:
+        unchanged = json.loads(INPUTS_PATH.read_text(encoding="utf-8")) == inputs
+    except Exception:
+        unchanged = False
+    if unchanged:
+        print(f"OK: No FRED updates since the last run; keeping {OUTPUT_XLSX}.")
+        print(f"-> Total runtime: {time.time() - t0:.1f} seconds")
+        raise SystemExit(0)
+
 # ------------------ PULL DATA ------------------
 records, latest_rows, failed = [], [], []
 SUMMARY_ROWS = [] 
+SUMMARY_POINTS = [] # one (FORECAST_HORIZON,) array per SUMMARY_ROWS entry
 ALL_FORECAST_TABLES = [] # This will be used to build one big sheet
-for i, (sid, label) in enumerate(all_items, start=1):
+prefetched, batches = {}, []
+if BATCH_CSV:
+    to_pull = [sid for sid, _ in all_items if sid not in cached_by_sid]
+    freq_by_sid = {m["FRED_Code"]: m.get("Frequency") for m in meta_rows}
+    batches = _batch_ids(to_pull, freq_by_sid)
+batched = {sid for b in batches for sid in b}
+
+def _submit_series(ex, sid):
+    return ex.submit(_fetch_series, sid, last_updated_by_sid.get(sid, ""),
+                     prefetched if sid in batched else None, cached_by_sid.get(sid))
+
+# One pool for both phases: ids outside every batch (cache hits, singletons) start
+# right away alongside the batch requests; batched ids are submitted once those land.
+fut_by_sid = {}
+with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as ex:
+    batch_futs = [ex.submit(_fetch_fredgraph_batch, b) for b in batches]
+    for sid, _ in all_items:
+        if sid not in batched:
+            fut_by_sid[sid] = _submit_series(ex, sid)
+    for j, (b, bf) in enumerate(zip(batches, batch_futs), start=1):
+        got = bf.result()
+        prefetched.update(got)
+        print(f"...fredgraph.csv batch {j}/{len(batches)} done "
+              f"({series_family(b[0])}, {freq_by_sid.get(b[0])}): {len(got)}/{len(b)} series")
+    if batches:
+        print(f">> fredgraph.csv: {len(prefetched)} series in {len(batches)} batched requests")
+    for sid, _ in all_items:
+        if sid in batched:
+            fut_by_sid[sid] = _submit_series(ex, sid)
+futures = [fut_by_sid[sid] for sid, _ in all_items]
+for i, ((sid, label), fut) in enumerate(zip(all_items, futures), start=1):
     try:
-        s = _load_cache_if_fresh(sid)
-        if s is None:
-            raw = retry_call(fred.get_series, sid, observation_start=START_DATE)
-            s = pd.Series(raw.values, index=pd.to_datetime(raw.index), name="value")
-            _save_cache(sid, s)
-
-        df = s.to_frame("value").reset_index().rename(columns={"index": "date"})
-        if df.empty:
+        s = fut.result()
+
+        # Raw arrays only; long_df is built once after the loop
+        dates = s.index if isinstance(s.index, pd.DatetimeIndex) else pd.DatetimeIndex(pd.to_datetime(s.index))
+        vals = s.to_numpy(dtype=np.float64)
+        if not dates.is_monotonic_increasing:
+            order = dates.argsort(kind="stable")
+            dates, vals = dates[order], vals[order]
+        if vals.size == 0:
             failed.append({"FRED_Code": sid, "Reason": "Empty series"})
         else:
-            base = df[df["date"].dt.year == BASE_YEAR]["value"].mean()
-            df["index_2019=100"] = (df["value"] / base) * 100 if pd.notna(base) and base != 0 else pd.NA
-            df["series_id"] = sid
-            df["series_label"] = label
-            df["family"] = series_family(sid)
-            records.append(df)
-            latest_rows.append({"FRED_Code": sid, "Label": label, "Latest Available": df["date"].max()})
-            
-            # -----------------------------------------------------------------
-            # --- FORECASTING & SUMMARY BLOCK ---
-            # -----------------------------------------------------------------
-            try:
-                s_to_forecast = df.set_index("date")["index_2019=100"].dropna()
-                
-                # Align to month-start
-                s_to_forecast.index = s_to_forecast.index.to_period("M").to_timestamp(how="start")
-                s_to_forecast = s_to_forecast.asfreq("MS") 
-
-                if not s_to_forecast.empty and len(s_to_forecast) > 1:
-                    point_forecast_series, full_forecast_table = get_ets_forecast(
-                        s_to_forecast, FORECAST_HORIZON, MC_SIMS
-                    )
-                    
-                    # Add ID cols and append to single list
-                    full_forecast_table['series_id'] = sid
-                    full_forecast_table['series_label'] = label
-                    ALL_FORECAST_TABLES.append(full_forecast_table)
-
-                    # Build the Summary Row
-                    summary_row = {
-                        "Series Name": label,
-                        "FRED ID": sid,
-                        "Latest Actual Date": s_to_forecast.index[-1].strftime('%Y-%m-%d'),
-                        "Latest Actual Value": s_to_forecast.iloc[-1],
-                    }
-                    
-                    for j in range(FORECAST_HORIZON):
-                        col_name = f"{j+1}-Month Forecast (T+{j+1})"
-                        try:
-                            summary_row[col_name] = point_forecast_series.iloc[j]
-                        except IndexError:
-                            summary_row[col_name] = np.nan
-                            
-                    SUMMARY_ROWS.append(summary_row)
-                
-            except Exception as fc_e:
-                print(f"!! Forecast failed for {sid}: {fc_e}")
-            # --- END NEW BLOCK ---
-            
+            records.append((sid, label, dates.to_numpy(), vals))
+            latest_rows.append({"FRED_Code": sid, "Label": label, "Latest Available": dates.max()})
+
             if i % 25 == 0:
                 print(f"...pulled {i} series")
     except Exception as e:
         failed.append({"FRED_Code": sid, "Reason": str(e)})
-    finally:
-        call_counter += 1
-        polite_pause()
-        if COOLDOWN_EVERY_N_CALLS and call_counter % COOLDOWN_EVERY_N_CALLS == 0:
-            print(f"!! Cooldown: sleeping {COOLDOWN_SECONDS}s after {call_counter} total calls...")
-            time.sleep(COOLDOWN_SECONDS)
 
 # ------------------ ASSEMBLE TABLES ------------------
 if records:
-    long_df = pd.concat(records, ignore_index=True).sort_values(["series_id", "date"])
+    # Id order up front (each record is already date-ascending), so long_df comes out
+    # in (series_id, date) order with no frame-wide sort
+    records.sort(key=lambda r: r[0])
+    # One constructor call for all series instead of N per-series frames
+    lengths = [len(r[2]) for r in records]
+    long_df = pd.DataFrame({
+        "date": np.concatenate([r[2] for r in records]),
+        "value": np.concatenate([r[3] for r in records]),
+        "series_id": pd.Categorical(np.repeat([r[0] for r in records], lengths)),
+        "series_label": pd.Categorical(np.repeat([r[1] for r in records], lengths)),
+    })
+    sid_col = long_df["series_id"]
+
+    # family: one series_family() call per distinct id, broadcast by category code
+    fam_by_code = np.array([series_family(c) for c in sid_col.cat.categories], dtype=object)
+    long_df["family"] = pd.Categorical(fam_by_code[sid_col.cat.codes])
+
+    # 2019 base per series on its raw arrays (NaN-skipping mean, summed exactly as
+    # Series.mean does, so forecasts stay bit-reproducible), broadcast back with one repeat
+    base_bounds = np.array([BASE_START, BASE_END], dtype="datetime64[ns]")
+    bases = np.full(len(records), np.nan)
+    for k, (_, _, dates, vals) in enumerate(records):
+        v = vals[(dates >= base_bounds[0]) & (dates < base_bounds[1])]
+        n = np.count_nonzero(~np.isnan(v))
+        if n:
+            bases[k] = np.nan_to_num(v).sum() / n
+    bases[bases == 0] = np.nan
+    long_df.insert(2, "index_2019=100", long_df["value"].to_numpy() / np.repeat(bases, lengths) * 100)
+
+    # Wide panel (index_2019=100): long_df is in record order, so each series is a
+    # contiguous slice; join them with one concat(axis=1) instead of a long→wide pivot
+    ends = np.cumsum(lengths)
+    date_col = long_df["date"].to_numpy()
+    idx_col = long_df["index_2019=100"].to_numpy()
+    wide_cols = {}
+    for r, a, b in zip(records, ends - lengths, ends):
+        col = pd.Series(idx_col[a:b], index=pd.DatetimeIndex(date_col[a:b]))
+        wide_cols[r[0]] = col[~col.index.duplicated(keep="last")]
+    wide_idx = (
+        pd.concat(wide_cols, axis=1)
+        .dropna(axis=1, how="all")
+        .dropna(axis=0, how="all")
+        .sort_index()
+    )
+    wide_idx.index.name = "date"
+    wide_idx.columns.name = "series_id"
 else:
-    long_df = pd.DataFrame(columns=["date","value","index_2019=100","series_id","series_label","family"])
+    # Same categorical schema as a populated pull
+    long_df = pd.DataFrame({
+        "date": pd.Series(dtype="datetime64[ns]"),
+        "value": pd.Series(dtype=np.float64),
+        "index_2019=100": pd.Series(dtype=np.float64),
+        "series_id": pd.Categorical([]),
+        "series_label": pd.Categorical([]),
+        "family": pd.Categorical([]),
+    })
+    wide_idx = pd.DataFrame(index=pd.DatetimeIndex([], name="date"))
 
 latest_df = pd.DataFrame(latest_rows).sort_values("Latest Available", ascending=False)
 failed_df = pd.DataFrame(failed).sort_values("FRED_Code") if failed else pd.DataFrame(columns=["FRED_Code","Reason"])
 meta_df = pd.DataFrame(meta_rows).drop_duplicates(subset=["FRED_Code"]).sort_values("FRED_Code")
 
-# Wide pivot (index_2019=100)
-wide_idx = long_df.pivot_table(index="date", columns="series_id", values="index_2019=100", aggfunc="last").sort_index()
+# ------------------ FORECASTING & SUMMARY ------------------
+# Align to month-start once on the wide panel so every series shares one DatetimeIndex
+# Shallow copy: only the index is replaced, the column data is never written to
+wide_monthly = wide_idx.copy(deep=False)
+wide_monthly.index = wide_monthly.index.to_period("M").to_timestamp(how="start")
+multi_obs_sids = set()
+if wide_monthly.index.has_duplicates:
+    # Weekly/daily series put several observations in one month; asfreq("MS") rejects
+    # those, so they stay unforecast (as when each series was aligned on its own).
+    # Every other column has at most one value per month, which last() keeps as is.
+    obs_per_month = wide_monthly.notna().groupby(level=0).sum()
+    multi_obs_sids = set(obs_per_month.columns[(obs_per_month > 1).any()])
+    wide_monthly = wide_monthly.groupby(level=0).last()
+wide_monthly = wide_monthly.asfreq("MS")
+
+for sid, label in all_items:
+    if sid not in wide_monthly.columns:
+        continue
+    if sid in multi_obs_sids:
+        print(f"!! Forecast failed for {sid}: more than one observation per month")
+        continue
+    try:
+        s_to_forecast = wide_monthly[sid].dropna()
+
+        if not s_to_forecast.empty and len(s_to_forecast) > 1:
+            point_forecast_series, full_forecast_table = get_ets_forecast(
+                s_to_forecast, FORECAST_HORIZON, MC_SIMS
+            )
+            
+            # Add ID cols and append to single list
+            full_forecast_table['series_id'] = sid
+            full_forecast_table['series_label'] = label
+            ALL_FORECAST_TABLES.append(full_forecast_table)
+
+            # Summary: fixed cols as a tuple, point forecasts as one horizon-length row
+            SUMMARY_ROWS.append((
+                label,
+                sid,
+                s_to_forecast.index[-1].strftime('%Y-%m-%d'),
+                s_to_forecast.iloc[-1],
+            ))
+            pf = np.full(FORECAST_HORIZON, np.nan)
+            pf_vals = np.asarray(point_forecast_series, dtype=float)[:FORECAST_HORIZON]
+            pf[:len(pf_vals)] = pf_vals
+            SUMMARY_POINTS.append(pf)
+        
+    except Exception as fc_e:
+        print(f"!! Forecast failed for {sid}: {fc_e}")
 
 # ------------------ WRITE EXCEL ------------------
 print(f"Writing data to {OUTPUT_XLSX}...")
-with pd.ExcelWriter(OUTPUT_XLSX, engine="xlsxwriter") as xw:
+excel_options = {"constant_memory": True, "default_date_format": "yyyy-mm-dd", "strings_to_urls": False}
+# Written to a temp file and swapped in, so a crash mid-write never leaves a truncated workbook
+tmp_xlsx = str(Path(OUTPUT_XLSX).with_suffix(".tmp.xlsx"))
+with pd.ExcelWriter(tmp_xlsx, engine="xlsxwriter", engine_kwargs={"options": excel_options}) as xw:
     
     # --- 1. Summary Forecast Sheet ---
     if SUMMARY_ROWS:
-        summary_df = pd.DataFrame(SUMMARY_ROWS)
         tn_cols_ordered = [f"{i+1}-Month Forecast (T+{i+1})" for i in range(FORECAST_HORIZON)]
         fixed_cols = ["Series Name", "FRED ID", "Latest Actual Date", "Latest Actual Value"]
-        final_cols = fixed_cols + tn_cols_ordered
-        for c in final_cols:
-            if c not in summary_df.columns:
-                summary_df[c] = np.nan
-        summary_df[final_cols].to_excel(xw, sheet_name="Summary_Forecasts", index=False)
+        summary_df = pd.concat([
+            pd.DataFrame(SUMMARY_ROWS, columns=fixed_cols),
+            pd.DataFrame(np.vstack(SUMMARY_POINTS), columns=tn_cols_ordered),
+        ], axis=1)
+        write_sheet(xw, summary_df, "Summary_Forecasts")
     
     # --- 2. Consolidate All Forecasts ---
     if ALL_FORECAST_TABLES:
@@ -606,26 +895,33 @@ with pd.ExcelWriter(OUTPUT_XLSX, engine="xlsxwriter") as xw:
         all_fc_df = all_fc_df.reset_index().rename(columns={"index": "date"})
         cols_order = ["series_id", "series_label", "date", "actual", "fitted", "point_forecast", "p05", "p50", "p95"]
         present = [c for c in cols_order if c in all_fc_df.columns]
-        all_fc_df[present].to_excel(xw, sheet_name="All_Forecast_Data", index=False)
+        write_sheet(xw, all_fc_df[present], "All_Forecast_Data")
 
     # --- 3. Core Data Sheets ---
-    long_df.to_excel(xw, sheet_name="Series_Long", index=False)
-    wide_idx.to_excel(xw, sheet_name="Wide_Index2019")
-    latest_df.to_excel(xw, sheet_name="Latest_Dates", index=False)
-    meta_df.to_excel(xw, sheet_name="Metadata", index=False) 
-    failed_df.to_excel(xw, sheet_name="Failed", index=False)
+    write_sheet(xw, long_df, "Series_Long")
+    write_sheet(xw, wide_idx, "Wide_Index2019", index=True)
+    write_sheet(xw, latest_df, "Latest_Dates")
+    write_sheet(xw, meta_df, "Metadata")
+    write_sheet(xw, failed_df, "Failed")
     
     # --- 4. Family split (REMOVED) ---
     # for fam, fam_df in long_df.groupby("family"):
     #     fam_df.sort_values(["series_id","date"]).to_excel(xw, sheet_name=fam[:31], index=False)
 
+os.replace(tmp_xlsx, OUTPUT_XLSX)
+# Only a complete run is a valid baseline for skipping; failed ids must be retried next time
+if failed_df.empty:
+    INPUTS_PATH.write_text(json.dumps(inputs), encoding="utf-8")
+else:
+    INPUTS_PATH.unlink(missing_ok=True)
+
 # ------------------ TIMER END ------------------
 elapsed = time.time() - t0
 print(f"OK: Attempted {len(all_items)} series; saved {long_df['series_id'].nunique()} to {OUTPUT_XLSX}.")
 if not failed_df.empty:
     print(f"!! {len(failed_df)} series failed (see 'Failed' sheet).")
 if not SUMMARY_ROWS:
-    print(f"!! No forecasts were generated.")
+    print("!! No forecasts were generated.")
 else:
     print(f"OK: Saved {len(SUMMARY_ROWS)} forecasts to 'Summary_Forecasts' and 'All_Forecast_Data'.")
 print(f"-> Total runtime: {elapsed:.1f} seconds ({elapsed/60:.2f} minutes)")
@@ -6,9 +6,19 @@
 # 4) Adds Prather-style forecasts (point + MC fan) for each series
 
 import os, time, datetime
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# With several fit processes (FORECAST_WORKERS, below), give each one BLAS thread so the
+# pool doesn't oversubscribe the cores. Must be set before numpy loads; explicit env wins.
+if int(os.environ.get("FORECAST_WORKERS", str(os.cpu_count() or 1))) > 1:
+    for _var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(_var, "1")
+
 import numpy as np
 import pandas as pd
 from fredapi import Fred
+from fred_core import write_sheet
 
 # --- NEW: lightweight forecasting bits ---
 from statsmodels.tsa.arima.model import ARIMA
@@ -17,7 +27,14 @@ from statsmodels.tsa.holtwinters import ExponentialSmoothing
 # ------------------ CONFIG ------------------
 START_DATE   = "2016-01-01"
 BASE_YEAR    = 2019
+BASE_START, BASE_END = pd.Timestamp(BASE_YEAR, 1, 1), pd.Timestamp(BASE_YEAR + 1, 1, 1)
 OUTPUT_XLSX  = "fred_series_2019base.xlsx"
+FETCH_WORKERS = max(1, int(os.environ.get("FETCH_WORKERS", "4")))  # concurrent FRED pulls (network-bound)
+# Opt-in observation cache for local repeat runs: with CACHE_MAX_AGE_H > 0, a series pulled
+# within that many hours is read back from disk instead of FRED. Off by default so a smoke
+# run always exercises the live fetch path.
+CACHE_DIR = os.environ.get("CACHE_DIR", ".fred_cache")
+CACHE_MAX_AGE_H = float(os.environ.get("CACHE_MAX_AGE_H", "0"))
 
 # Keep test small & fast
 TEST_SERIES = {
@@ -31,6 +48,7 @@ FORECAST_HORIZON = int(os.environ.get("H", "12"))     # months
 BOOT_B = int(os.environ.get("MC_SIMS", "600"))        # MC runs (kept small for speed)
 BOOT_BLOCK = int(os.environ.get("MC_BLOCK", "6"))     # block length (months)
 MAX_TRAIN = int(os.environ.get("MAX_TRAIN", "120"))   # cap training window to last N months for speed
+FORECAST_WORKERS = int(os.environ.get("FORECAST_WORKERS", str(os.cpu_count() or 1)))  # processes for the fits
 
 # ------------------ FRED API KEY (ENV ONLY) ------------------
 FRED_API_KEY = os.environ.get("FRED_API_KEY")
@@ -45,23 +63,11 @@ t0 = time.time()
 def _to_month_start(s: pd.Series) -> pd.Series:
     if s is None or len(s) == 0:
         return pd.Series(dtype=float)
-    s = pd.Series(s.values, index=pd.to_datetime(s.index))
-    s.index = s.index.to_period("M").to_timestamp(how="start")
+    # fredapi already returns a DatetimeIndex; parse only when handed anything else
+    idx = s.index if isinstance(s.index, pd.DatetimeIndex) else pd.to_datetime(s.index)
+    s = pd.Series(s.to_numpy(), index=idx.to_period("M").to_timestamp(how="start"))
     return s.sort_index()
 
-def _normalize_2019(s: pd.Series) -> pd.Series:
-    if s.empty:
-        return s
-    base_vals = s[s.index.year == BASE_YEAR].dropna()
-    if not base_vals.empty:
-        base = base_vals.mean()
-    else:
-        w = s.dropna().iloc[:12]
-        base = w.mean() if not w.empty else 1.0
-    if not np.isfinite(base) or base == 0:
-        base = 1.0
-    return (s / base) * 100.0
-
 def _fit_prather_point(series: pd.Series, H: int) -> tuple[pd.Series, pd.Series, str]:
     """
     Return (point_forecast, fitted_in_sample, method) using quick fallback chain:
@@ -116,103 +122,169 @@ def _fit_prather_point(series: pd.Series, H: int) -> tuple[pd.Series, pd.Series,
 def _block_bootstrap_fan(point_fc: pd.Series, resid: np.ndarray, B: int, block_len: int) -> pd.DataFrame:
     """Simple block-bootstrap fan to preserve short-run autocorr in residuals."""
     H = len(point_fc)
+    point = point_fc.to_numpy(dtype=float)
+    # One seeded Generator for both branches: fans don't depend on the global numpy
+    # state, so they reproduce whichever pool worker (or order) fits the series
+    rng = np.random.default_rng(42)
     if resid is None or len(resid) < 3 or not np.isfinite(resid).any():
         # fall back to white noise with small std
-        noise = np.random.normal(0, 0.5, size=(B, H))
-        paths = noise + point_fc.values
+        noise = rng.normal(0, 0.5, size=(B, H))
+        paths = noise + point
     else:
-        rng = np.random.default_rng(42)
-        paths = np.empty((B, H))
         resid = np.asarray(resid, dtype=float)
         block_len = max(3, int(block_len))
-        for b in range(B):
-            seq = []
-            while len(seq) < H:
-                start = rng.integers(0, max(1, len(resid) - block_len + 1))
-                seq.extend(resid[start:start + block_len])
-            seq = np.array(seq[:H])
-            paths[b, :] = point_fc.values + seq
-
-    fan = pd.DataFrame(paths.T, index=point_fc.index)
-    q = fan.quantile([0.05, 0.10, 0.50, 0.90, 0.95], axis=1).T
-    q.columns = ["p05", "p10", "p50", "p90", "p95"]
-    return q
+        # All B paths at once: draw every block start, then gather resid with one fancy index.
+        # A block is resid[start:start + block_len], i.e. all of resid when it's shorter.
+        step = min(block_len, len(resid))
+        n_blocks = -(-H // step)
+        starts = rng.integers(0, max(1, len(resid) - block_len + 1), size=(B, n_blocks))
+        idx = (starts[:, :, None] + np.arange(step)).reshape(B, -1)[:, :H]
+        paths = point + resid[idx]
+
+    q = np.quantile(paths, [0.05, 0.10, 0.50, 0.90, 0.95], axis=0).T
+    return pd.DataFrame(q, index=point_fc.index, columns=["p05", "p10", "p50", "p90", "p95"])
+
+def _forecast_one(args):
+    """
+    Process-pool worker: (sid, values, dates) as plain arrays → (sid, point_fc, fan, method).
+    Fit + residuals + fan for one series; series are independent, so they fit in parallel.
+    """
+    sid, values, dates = args
+    series = pd.Series(values, index=pd.DatetimeIndex(dates))
+
+    # point + fitted + method
+    point_fc, fitted, method = _fit_prather_point(series, FORECAST_HORIZON)
+
+    # residuals (in-sample): fitted is indexed by the training window, the tail of
+    # `series`, so actual - fitted is a plain array subtraction
+    y_vals = series.to_numpy(dtype=float)
+    r = y_vals[-len(fitted):] - fitted.to_numpy(dtype=float)
+    resid = r[np.isfinite(r)]
+    if resid.size < 3:
+        resid = np.diff(y_vals)  # fallback
+
+    # fan
+    fan = _block_bootstrap_fan(point_fc, resid, B=BOOT_B, block_len=BOOT_BLOCK)
+    return sid, point_fc, fan, method
 
 # ------------------ PULL + NORMALIZE ------------------
-records = []
-for sid, label in TEST_SERIES.items():
-    s = fred.get_series(sid, observation_start=START_DATE)
-    s = _to_month_start(s)
+def _cache_file(sid: str) -> str:
+    return os.path.join(CACHE_DIR, f"{sid}_{START_DATE}.csv")
+
+def _pull(sid: str) -> pd.Series:
+    """Thread worker: fresh disk cache hit, else one blocking FRED round-trip → month-start Series."""
+    path = _cache_file(sid)
+    if CACHE_MAX_AGE_H > 0:
+        try:
+            if time.time() - os.path.getmtime(path) < CACHE_MAX_AGE_H * 3600:
+                df = pd.read_csv(path, parse_dates=["date"], float_precision="round_trip")
+                return pd.Series(df["value"].to_numpy(dtype=float), index=pd.DatetimeIndex(df["date"]))
+        except (OSError, ValueError, KeyError):
+            pass
+    s = _to_month_start(fred.get_series(sid, observation_start=START_DATE))
+    if CACHE_MAX_AGE_H > 0:
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            pd.DataFrame({"date": s.index, "value": s.to_numpy(dtype=float)}).to_csv(path, index=False)
+        except OSError:
+            pass
+    return s
+
+records = []  # (sid, label, dates, values) arrays; long_df is built once below
+# map() yields in TEST_SERIES order, so the tables keep the serial layout
+with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as ex:
+    pulled = list(ex.map(_pull, TEST_SERIES))
+for (sid, label), s in zip(TEST_SERIES.items(), pulled):
     if s.empty:
         continue
-    df = s.to_frame("value")
-    df["index_2019=100"] = _normalize_2019(df["value"])
-    df["series_id"] = sid
-    df["series_label"] = label
-    records.append(df.reset_index().rename(columns={"index": "date"}))
+    records.append((sid, label, s.index.to_numpy(), s.to_numpy(dtype=float)))
 
 if not records:
     raise RuntimeError("No series downloaded for the test set.")
 
-long_df = pd.concat(records, ignore_index=True).sort_values(["series_id", "date"])
-wide_idx = long_df.pivot_table(index="date", columns="series_id", values="index_2019=100", aggfunc="last").sort_index()
+# Ids sorted up front and each series already date-ascending, so no frame-wide sort
+records.sort(key=lambda r: r[0])
+lengths = [len(r[2]) for r in records]
+long_df = pd.DataFrame({
+    "date": np.concatenate([r[2] for r in records]),
+    "value": np.concatenate([r[3] for r in records]),
+    # categorical id/label: one small code per row instead of a Python str object
+    "series_id": pd.Categorical(np.repeat([r[0] for r in records], lengths)),
+    "series_label": pd.Categorical(np.repeat([r[1] for r in records], lengths)),
+})
+
+# 2019=100 for every series at once: one groupby for the base means, broadcast back by category code.
+# No base-year data → mean of the first 12 valid points; a zero/non-finite base → 1.0.
+sid_col, value_s = long_df["series_id"], long_df["value"]
+valid = value_s.notna()
+in_base = valid & (long_df["date"] >= BASE_START) & (long_df["date"] < BASE_END)
+bases = value_s[in_base].groupby(sid_col[in_base], observed=True).mean()
+first12 = value_s[valid].groupby(sid_col[valid], observed=True).head(12)
+first12 = first12.groupby(sid_col[first12.index], observed=True).mean()
+cats = sid_col.cat.categories
+base = bases.reindex(cats).fillna(first12.reindex(cats)).to_numpy()[sid_col.cat.codes]
+base = np.where(np.isfinite(base) & (base != 0), base, 1.0)
+long_df.insert(2, "index_2019=100", value_s / base * 100.0)
+# series_id×date is unique once month-start duplicates are dropped, so a plain pivot
+# (reshape only, no groupby) reproduces pivot_table(aggfunc="last")
+wide_idx = (
+    long_df.drop_duplicates(["series_id", "date"], keep="last")
+    .pivot(index="date", columns="series_id", values="index_2019=100")
+    .dropna(axis=1, how="all")
+    .dropna(axis=0, how="all")
+    .sort_index()
+)
 
 # ------------------ PRATHER FORECASTS (per series) ------------------
-fc_rows = []            # long table of point + fan
-point_wide = {}         # wide table of points
-fan_wides = {k: {} for k in ["p05","p10","p50","p90","p95"]}
+FAN_COLS = ["p05", "p10", "p50", "p90", "p95"]
 
+tasks = []
 for sid in wide_idx.columns:
     series = wide_idx[sid].dropna()
-    if series.empty:
-        continue
-
-    # point + fitted + method
-    point_fc, fitted, method = _fit_prather_point(series, FORECAST_HORIZON)
-
-    # residuals (in-sample)
-    try:
-        # align fitted to actual
-        common = series.reindex(fitted.index).dropna()
-        resid = (common - fitted.reindex(common.index)).dropna().values
-        if len(resid) < 3:
-            resid = (series.diff().dropna().values)  # fallback
-    except Exception:
-        resid = (series.diff().dropna().values)
-
-    # fan
-    fan = _block_bootstrap_fan(point_fc, resid, B=BOOT_B, block_len=BOOT_BLOCK)
-
-    # pack long rows
-    tmp = pd.concat([point_fc.rename("point"), fan], axis=1).reset_index().rename(columns={"index":"date"})
-    tmp["series_id"] = sid
-    tmp["method"] = method
-    fc_rows.append(tmp)
-
-    # wide conveniences
-    point_wide[sid] = point_fc
-    for q in fan.columns:
-        fan_wides[q][sid] = fan[q]
+    if not series.empty:
+        tasks.append((sid, series.to_numpy(), series.index.to_numpy()))
+
+# Workers are forked, so they inherit this module's state and the script body never re-runs;
+# where fork isn't available (Windows/macOS spawn) the fits stay serial.
+if FORECAST_WORKERS > 1 and len(tasks) > 1 and "fork" in mp.get_all_start_methods():
+    with ProcessPoolExecutor(max_workers=min(FORECAST_WORKERS, len(tasks)),
+                             mp_context=mp.get_context("fork")) as ex:
+        results = list(ex.map(_forecast_one, tasks))
+else:
+    results = [_forecast_one(t) for t in tasks]
 
 # Assemble forecast tables
-prather_long = pd.concat(fc_rows, ignore_index=True).sort_values(["series_id","date"])
-
-prather_point_wide = pd.DataFrame(point_wide).sort_index()
-prather_fan_wides = {q: pd.DataFrame(cols).sort_index() for q, cols in fan_wides.items()}
+# Long table of point + fan in one constructor over concatenated arrays. Results follow
+# wide_idx's sorted columns and each horizon is date-ascending, so it's already in
+# (series_id, date) order.
+horizons = [len(point_fc) for _, point_fc, _, _ in results]
+prather_long = pd.DataFrame({
+    "date": np.concatenate([point_fc.index.to_numpy() for _, point_fc, _, _ in results]),
+    "point": np.concatenate([point_fc.to_numpy() for _, point_fc, _, _ in results]),
+    **{q: np.concatenate([fan[q].to_numpy() for _, _, fan, _ in results]) for q in FAN_COLS},
+    "series_id": np.repeat([sid for sid, _, _, _ in results], horizons).astype(object),
+    "method": np.repeat([method for _, _, _, method in results], horizons).astype(object),
+})
+
+# wide conveniences
+prather_point_wide = pd.DataFrame({sid: point_fc for sid, point_fc, _, _ in results}).sort_index()
+prather_fan_wides = {q: pd.DataFrame({sid: fan[q] for sid, _, fan, _ in results}).sort_index()
+                     for q in FAN_COLS}
 
 # ------------------ WRITE EXCEL ------------------
-with pd.ExcelWriter(OUTPUT_XLSX, engine="xlsxwriter") as xw:
+excel_options = {"constant_memory": True, "default_date_format": "yyyy-mm-dd", "strings_to_urls": False}
+with pd.ExcelWriter(OUTPUT_XLSX, engine="xlsxwriter", engine_kwargs={"options": excel_options}) as xw:
     # originals
-    long_df.to_excel(xw, sheet_name="Series_Long", index=False)
-    wide_idx.to_excel(xw, sheet_name="Wide_Index2019")
+    write_sheet(xw, long_df, "Series_Long")
+    write_sheet(xw, wide_idx, "Wide_Index2019", index=True)
 
     # forecasts (long + wide)
-    prather_long.to_excel(xw, sheet_name="Prather_Forecast_Long", index=False)
+    write_sheet(xw, prather_long, "Prather_Forecast_Long")
 
-    prather_point_wide.to_excel(xw, sheet_name="Prather_Point_ALL")
+    write_sheet(xw, prather_point_wide.rename_axis("date"), "Prather_Point_ALL", index=True)
     # put fan quantiles on separate sheets for quick snapshots
     for q, dfq in prather_fan_wides.items():
-        dfq.to_excel(xw, sheet_name=f"Prather_Fan_ALL_{q.upper()}")
+        write_sheet(xw, dfq.rename_axis("date"), f"Prather_Fan_ALL_{q.upper()}", index=True)
 
 print(f"✅ Test Excel written: {OUTPUT_XLSX}")
 elapsed = time.time() - t0
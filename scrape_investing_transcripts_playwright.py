@@ -1,8 +1,8 @@
 import argparse, time, re, sys
-from datetime import datetime
+from datetime import datetime, timedelta
 from urllib.parse import urljoin
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Tag
 from dateutil import parser as dtparser
 from playwright.sync_api import sync_playwright, TimeoutError as PWTimeout
 
@@ -11,6 +11,8 @@ SEP = "===FREIGHT PULSE NEWS BREAK==="
 
 # This selector is no longer actively awaited, but kept for clarity in the links function.
 ARTICLE_LIST_SELECTOR = 'div[data-test="news-container"]'
+# High-confidence transcript links: what get_listing_links collects and the listing load waits for
+TRANSCRIPT_LINK_XPATH = "//a[contains(@href, '/news/transcripts/') and (.//h2 or .//h3)]"
 
 # Flexible "Published ..." capture (handles "Nov 4, 2025 09:36AM ET" & "11/04/2025, 09:36 AM")
 PUBLISH_RE = re.compile(r"Published\s+([A-Za-z0-9:,\s/]+)(?:\s*(?:ET|UTC|GMT))?\b", re.I)
@@ -26,6 +28,16 @@ STOP_GUARDS = [
     re.compile(r"\bprivacy\b", re.I),
     re.compile(r"\bshare this article\b", re.I),
 ]
+# All guards as one alternation: a single scan per text node instead of one search per guard
+STOP_GUARD_RE = re.compile("|".join(f"(?:{r.pattern})" for r in STOP_GUARDS), re.I)
+HEADING_TAGS = {"h1","h2","h3","h4","h5","h6","strong","b"}
+# Walk stops for extract_key_takeaways_to_end (class/id keys match as substrings)
+STOP_TAG_NAMES = frozenset({"footer","nav","aside"})
+STOP_CLASS_KEYS = ("comments","related","most-read","share","social","sponsored","tags")
+STOP_ID_KEYS = ("comments","related","most","share","sponsored","tags")
+CHUNK_TAG_NAMES = frozenset({"p","li"})
+# First character that ends PUBLISH_RE's date capture
+PUBLISH_END_RE = re.compile(r"[^A-Za-z0-9:,\s/]")
 
 def parse_publish(text: str):
     m = PUBLISH_RE.search(text)
@@ -38,22 +50,41 @@ def parse_publish(text: str):
     except Exception:
         return raw, None
 
-def extract_key_takeaways_to_end(html: str) -> str | None:
-    soup = BeautifulSoup(html, "html.parser")
+def find_publish(soup):
+    """
+    parse_publish over soup.get_text(" ", strip=True) without building the whole page's
+    text. Strings are joined into a short tail: with no match only the last 9 chars are
+    kept (a "Published" needing the next string), with an open match its text is kept,
+    and the scan stops once the date run is closed by a non-date character.
+    """
+    tail = ""
+    for s in soup.stripped_strings:
+        tail = f"{tail} {s}" if tail else s
+        m = PUBLISH_RE.search(tail)
+        if not m:
+            tail = tail[-9:]
+        elif PUBLISH_END_RE.search(tail, m.start(1)):
+            break
+        else:
+            tail = tail[m.start():]
+    return parse_publish(tail)
+
+def _is_short_takeaways(tag) -> bool:
+    t = tag.get_text(" ", strip=True)
+    return bool(t and len(t) <= 120 and KEY_TAKEAWAYS_RE.search(t))
+
+def extract_key_takeaways_to_end(soup: BeautifulSoup) -> str | None:
+    # Takes the caller's parsed tree (read-only), so each article is parsed once
     article = soup.find("article") or soup
 
-    # Find heading-like "Key Takeaways"
-    start = None
-    for tag in article.find_all(["h1","h2","h3","h4","h5","h6","strong","b"]):
-        if KEY_TAKEAWAYS_RE.search(tag.get_text(" ", strip=True) or ""):
-            start = tag
-            break
+    # Find heading-like "Key Takeaways"; find() stops at the first match in document
+    # order instead of materializing every heading/bold tag first
+    start = article.find(
+        lambda tag: tag.name in HEADING_TAGS
+        and KEY_TAKEAWAYS_RE.search(tag.get_text(" ", strip=True) or "")
+    )
     if not start:
-        for p in article.find_all("p"):
-            t = p.get_text(" ", strip=True)
-            if t and len(t) <= 120 and KEY_TAKEAWAYS_RE.search(t):
-                start = p
-                break
+        start = article.find(lambda tag: tag.name == "p" and _is_short_takeaways(tag))
     if not start:
         return None
 
@@ -61,23 +92,25 @@ def extract_key_takeaways_to_end(html: str) -> str | None:
     for el in start.next_elements:
         if el is article:
             break
-        if hasattr(el, "name") and el.name in ("footer","nav","aside"):
-            break
-        if hasattr(el, "get"):
-            klass = " ".join(el.get("class", [])).lower() if el.get("class") else ""
-            eid = (el.get("id") or "").lower()
-            if any(k in klass for k in ("comments","related","most-read","share","social","sponsored","tags")):
-                break
-            if any(k in eid for k in ("comments","related","most","share","sponsored","tags")):
+        # Tag-only checks behind one isinstance test; text nodes skip straight to get_text
+        if isinstance(el, Tag):
+            if el.name in STOP_TAG_NAMES:
                 break
-        if hasattr(el, "get_text"):
-            t = el.get_text(" ", strip=True)
-            if t:
-                if any(r.search(t) for r in STOP_GUARDS):
+            classes = el.get("class")
+            if classes:
+                klass = " ".join(classes).lower()
+                if any(k in klass for k in STOP_CLASS_KEYS):
                     break
-                if getattr(el, "name","") in ("p","li"):
-                    if not chunks or chunks[-1] != t:
-                        chunks.append(t)
+            eid = el.get("id")
+            if eid and any(k in eid.lower() for k in STOP_ID_KEYS):
+                break
+        t = el.get_text(" ", strip=True)
+        if t:
+            if STOP_GUARD_RE.search(t):
+                break
+            if el.name in CHUNK_TAG_NAMES:
+                if not chunks or chunks[-1] != t:
+                    chunks.append(t)
     return "\n".join(chunks) if chunks else None
 
 def same_day(dt_iso, target_date):
@@ -86,42 +119,63 @@ def same_day(dt_iso, target_date):
 def older_than(dt_iso, target_date):
     return datetime.fromisoformat(dt_iso).date() < target_date
 
-def get_listing_links(page) -> list[str]:
+def listing_date(iso: str | None):
+    """Date of a listing <time datetime=...> value, or None if absent/unparseable."""
+    if not iso:
+        return None
+    try:
+        return dtparser.parse(iso).date()
+    except Exception:
+        return None
+
+def get_listing_links(page) -> list[tuple[str, str | None]]:
     """
-    Collects article links using a precise selector for transcript pages.
+    Collects article links using a precise selector for transcript pages, each with the
+    listing's own <time datetime> (None when the card has none).
     Guarantees scroll to load lazy content before selection.
     """
-    # Pre-scroll down to trigger lazy loading of pagination/links
-    for frac in (0.25, 0.5, 0.9, 1.0):
-        page.evaluate("window.scrollTo(0, document.body.scrollHeight*%s)" % frac)
-        time.sleep(0.6)
+    # Pre-scroll down to trigger lazy loading of pagination/links: one viewport per step
+    # inside the page's event loop (a single round-trip), then a short settle at the bottom
+    page.evaluate("""async () => {
+        const pause = ms => new Promise(r => setTimeout(r, ms));
+        for (let i = 0, y = 0; i < 50 && y < document.body.scrollHeight; i++, y += window.innerHeight) {
+            window.scrollTo(0, y);
+            await pause(100);
+        }
+        window.scrollTo(0, document.body.scrollHeight);
+        await pause(600);
+    }""")
 
-    # Use a specific XPath to filter for only high-confidence transcript links
-    xpath_selector = "//a[contains(@href, '/news/transcripts/') and (.//h2 or .//h3)]"
-    
-    urls = []
-    # Use Playwright's locator method which is efficient
-    locator = page.locator(xpath_selector)
-    count = locator.count()
-    
-    for i in range(min(count, 2000)):
-        try:
-            href = locator.nth(i).get_attribute("href") or ""
-            if href:
-                # Ensure absolute URL
-                if href.startswith("/"):
-                    href = urljoin(BASE_URL, href)
-                urls.append(href)
-        except Exception:
-            continue
+    # One page.evaluate returns every [href, listing time] in a single round-trip, instead
+    # of a locator.nth(i).get_attribute() RPC per link (so no cap on the match count)
+    items = page.evaluate(
+        """(xpath) => {
+            const r = document.evaluate(xpath, document, null,
+                                        XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+            const out = [];
+            for (let i = 0; i < r.snapshotLength; i++) {
+                const a = r.snapshotItem(i);
+                // Only the link's own card: a bare parentElement can be the shared list
+                // container and hand back another card's date (no card → date unknown)
+                const card = a.closest("article, li");
+                const t = a.querySelector("time[datetime]")
+                    || (card && card.querySelector("time[datetime]"));
+                out.push([a.getAttribute("href") || "", t ? t.getAttribute("datetime") : null]);
+            }
+            return out;
+        }""",
+        TRANSCRIPT_LINK_XPATH,
+    )
 
-    # de-dup while preserving order
-    seen, out = set(), []
-    for u in urls:
-        if u not in seen:
-            seen.add(u)
-            out.append(u)
-    return out
+    # de-dup while preserving order (first listing time wins)
+    out = {}
+    for href, listed in items:
+        if href:
+            # Ensure absolute URL
+            if href.startswith("/"):
+                href = urljoin(BASE_URL, href)
+            out.setdefault(href, listed)
+    return list(out.items())
 
 def click_next(page) -> bool:
     """
@@ -141,8 +195,8 @@ def click_next(page) -> bool:
             pass
     return False
 
-def parse_article(page, url: str, delay: float):
-    page.goto(url, wait_until="domcontentloaded")
+def live_dom_soup(page):
+    """Cookie banner + content wait, then parse the rendered DOM (the slow path)."""
     time.sleep(1.0)
     # try generic cookie accept (best effort)
     for text in ["Accept", "AGREE", "I Accept"]:
@@ -162,8 +216,25 @@ def parse_article(page, url: str, delay: float):
     except PWTimeout:
         pass
 
-    html = page.content()
-    soup = BeautifulSoup(html, "html.parser")
+    return BeautifulSoup(page.content(), "html.parser")
+
+def parse_article(page, url: str, delay: float):
+    response = page.goto(url, wait_until="domcontentloaded")
+    # The server-rendered body already carries the article text; reading it skips the
+    # page.content() DOM re-serialization. Fall back to the live DOM when the response
+    # isn't a 200 HTML document or holds no Key Takeaways section.
+    soup, content = None, None
+    if response is not None and response.status == 200 \
+            and "html" in (response.headers.get("content-type") or ""):
+        try:
+            soup = BeautifulSoup(response.text(), "html.parser")
+            content = extract_key_takeaways_to_end(soup)
+        except Exception:
+            soup = None
+    if not content:
+        soup = live_dom_soup(page)
+        content = extract_key_takeaways_to_end(soup)
+
     title = ""
     h1 = soup.find("h1")
     if h1 and h1.get_text(strip=True):
@@ -171,10 +242,8 @@ def parse_article(page, url: str, delay: float):
     else:
         h2 = soup.find("h2")
         title = h2.get_text(strip=True) if h2 else ""
-    page_text = soup.get_text(" ", strip=True)
-    published_str, published_iso = parse_publish(page_text)
+    published_str, published_iso = find_publish(soup)
 
-    content = extract_key_takeaways_to_end(html)
     if not content:
         article = soup.find("article") or soup
         parts = []
@@ -192,32 +261,33 @@ def parse_article(page, url: str, delay: float):
         "content": content,
     }
 
-def write_txt(results, out_path):
-    with open(out_path, "w", encoding="utf-8") as f:
-        first = True
-        for r in results:
-            if not first:
-                f.write("\n" + SEP + "\n\n")
-            first = False
-            title = r.get("title") or ""
-            pub = r.get("published_str") or ""
-            url = r.get("url") or ""
-            content = r.get("content") or ""
-
-            if title: f.write(title.strip() + "\n")
-            if pub:   f.write(f"Published: {pub}\n")
-            if url:   f.write(f"URL: {url}\n")
-            if title or pub or url: f.write("\n")
-            f.write((content or "").strip() + "\n")
+def write_record(f, r, first: bool):
+    """Append one article to an open transcripts file (separator before all but the first)."""
+    if not first:
+        f.write("\n" + SEP + "\n\n")
+    title = r.get("title") or ""
+    pub = r.get("published_str") or ""
+    url = r.get("url") or ""
+    content = r.get("content") or ""
+
+    if title: f.write(title.strip() + "\n")
+    if pub:   f.write(f"Published: {pub}\n")
+    if url:   f.write(f"URL: {url}\n")
+    if title or pub or url: f.write("\n")
+    f.write((content or "").strip() + "\n")
+    f.flush()
 
 def scrape_playwright(target_date_str: str, out_path: str, delay: float = 5.0, max_pages: int = 10, headless: bool = True):
     target_date = datetime.strptime(target_date_str, "%Y-%m-%d").date()
-    results, got_any_for_target = [], False
+    n_written, got_any_for_target = 0, False
 
-    with sync_playwright() as pw:
+    # Articles are written as they are kept rather than buffered for one write at the end
+    with sync_playwright() as pw, open(out_path, "w", encoding="utf-8") as out:
         # Use chromium which is generally good in cloud/headless environments
         browser = pw.chromium.launch(headless=headless, args=["--lang=en-US"])
         context = browser.new_context(locale="en-US", viewport={"width":1280,"height":1600})
+        # Images/fonts/media are never read; aborting them cuts most of each page's payload
+        context.route("**/*.{png,jpg,jpeg,gif,webp,svg,ico,woff,woff2,ttf,mp4,webm}", lambda route: route.abort())
         page = context.new_page()
         
         # --- FIX 1: Maximize Navigation Stability Timeout (Overall) ---
@@ -236,11 +306,14 @@ def scrape_playwright(target_date_str: str, out_path: str, delay: float = 5.0, m
         except Exception:
             pass
         
-        # --- FINAL CRITICAL FIX: Replace conditional selector wait with a fixed wait ---
-        # This addresses the persistent 0-byte output by forcing the script 
-        # to wait a reasonable time before attempting to scrape links.
-        time.sleep(15.0) 
-        # print("Final fixed wait completed. Attempting to gather links...")
+        # --- Wait for the transcript links themselves (the XPath get_listing_links reads) ---
+        # A fixed 15s sleep used to stand in here after waiting on the list container proved
+        # unreliable (0-byte output); this returns as soon as a link exists, and on timeout
+        # carries on to the scrape exactly as the fixed wait did.
+        try:
+            page.wait_for_selector(f"xpath={TRANSCRIPT_LINK_XPATH}", state="attached", timeout=30000)
+        except PWTimeout:
+            pass
         
         page_idx = 0
         while page_idx < max_pages:
@@ -256,27 +329,37 @@ def scrape_playwright(target_date_str: str, out_path: str, delay: float = 5.0, m
             if not links:
                 break
 
-            for url in links:
+            for url, listed in links:
+                # Skip the article load when the listing already dates it out of range. The
+                # listing time may use another timezone than the article's "Published" line,
+                # so only links more than a day off the target are decided here.
+                listed_day = listing_date(listed)
+                if listed_day and listed_day > target_date + timedelta(days=1):
+                    continue  # newer than the target: its parse would be discarded anyway
+                if listed_day and listed_day < target_date - timedelta(days=1):
+                    if got_any_for_target:
+                        context.close(); browser.close()
+                        return # Stop and exit function immediately
+                    continue
+
                 art = parse_article(page, url, delay)
                 
                 if art["published_iso"]:
                     if same_day(art["published_iso"], target_date):
                         got_any_for_target = True
-                        results.append(art)
+                        write_record(out, art, n_written == 0); n_written += 1
                     elif older_than(art["published_iso"], target_date):
                         if got_any_for_target:
-                            write_txt(results, out_path)
                             context.close(); browser.close()
                             return # Stop and exit function immediately
                 else:
                     # keep unknowns for visibility / debugging
-                    results.append(art)
+                    write_record(out, art, n_written == 0); n_written += 1
 
             if not click_next(page):
                 break # Break if no next button found
             time.sleep(delay)
 
-        write_txt(results, out_path)
         context.close(); browser.close()
 
 def main():
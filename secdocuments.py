@@ -4,7 +4,11 @@ import os
 import re
 import csv
 import hashlib
+import inspect
+import json
+from functools import lru_cache
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 # edgartools installs as the "edgar" module
 try:
@@ -42,6 +46,15 @@ CORE_FORMS = {
     "425",
 }
 
+# Tie-break order for surfaced hits of equal score (unlisted forms sort last)
+FORM_RANK = {
+    "8-K": 1, "6-K": 1, "8-K/A": 1, "6-K/A": 1,
+    "10-Q": 2, "10-K": 2, "20-F": 2, "10-Q/A": 2, "10-K/A": 2, "20-F/A": 2,
+    "S-4": 3, "S-4/A": 3,
+    "424B": 4, "424B1": 4, "424B2": 4, "424B3": 4, "424B4": 4, "424B5": 4,
+    "FWP": 4, "S-1": 4, "S-1/A": 4, "S-3": 4, "S-3/A": 4, "425": 4,
+}
+
 # Direct freight / logistics / network language
 DIRECT_KEYWORDS = {
     r"\bintermodal\b": 3, r"\brail\b": 2, r"\brailroad\b": 3, r"\bdrayage\b": 4,
@@ -178,45 +191,147 @@ MODE_TAGS = [
 SCORE_THRESHOLD = 2
 FULLTEXT_THRESHOLD = 5
 
+# FAST_PREFILTER=1: off-form filings from issuers outside the watchlist can only ever reach
+# the recall floor, so skip fetching their text (f.text()) and score them on company name
+# alone. Off by default so the recall floor matches a full scan.
+FAST_PREFILTER = os.getenv("FAST_PREFILTER", "0") == "1"
+
+# MAX_FILING_AGE_DAYS=N: drop feed entries filed more than N days before the run date
+# before their text is fetched (0 = keep the whole feed; undated filings are always kept)
+MAX_FILING_AGE_DAYS = int(os.getenv("MAX_FILING_AGE_DAYS", "0"))
+
+# Filings fetched/scored concurrently (f.text() is network-bound)
+FETCH_WORKERS = max(1, int(os.getenv("FETCH_WORKERS", "4")))
+
+# Scored-filing cache: get_current_filings() is a rolling window, so consecutive runs
+# see mostly the same filings. A filing scored within SCORED_CACHE_DAYS days (0 disables)
+# is reused by URL without fetching its text again. Kept outside output/ (that folder is
+# zipped and mailed).
+SCORED_CACHE_PATH = os.getenv("SCORED_CACHE_PATH", ".sec_cache/scored_filings.json")
+SCORED_CACHE_DAYS = int(os.getenv("SCORED_CACHE_DAYS", "7"))
+
+# TEXT_CACHE_DIR=<dir>: also keep each fetched filing text there (by URL hash) for
+# TEXT_CACHE_DAYS days, so filings the score cache can't reuse (saved full texts, runs
+# after a keyword change) are rescored without downloading again. Off by default:
+# filing texts run to megabytes each.
+TEXT_CACHE_DIR = os.getenv("TEXT_CACHE_DIR", "")
+TEXT_CACHE_DAYS = int(os.getenv("TEXT_CACHE_DAYS", "7"))
+
+# Every pattern above is \b-anchored and case-insensitive. Filings are case-folded once
+# (fold_case) and the patterns compiled lowercased with no re.IGNORECASE flag, which
+# matches the same text without per-character case folding inside the regex engine.
+# Each keyword also carries its leading word: a match can only start where that word
+# occurs, so a plain substring find (C speed) rules most patterns out before any regex
+# scan, and a hit tells the regex where to start.
+LEAD_WORD_RE = re.compile(r"\\b([A-Za-z]+)")
+# IGNORECASE equates these with i/s; str.lower() doesn't ('İ'.lower() is even two chars)
+FOLD_TABLE = str.maketrans({"\u0130": "i", "\u0131": "i", "\u017f": "s"})
+
+def fold_case(text: str) -> str:
+    """Lowercased text, same length/offsets as `text`, for the lowercase patterns."""
+    return text.lower() if text.isascii() else text.translate(FOLD_TABLE).lower()
+
+def lead_literal(pattern: str) -> str:
+    """Lowercased word every match of `pattern` begins with ("" if it has none)."""
+    m = LEAD_WORD_RE.match(pattern)
+    if not m:
+        return ""
+    word = m.group(1)
+    if pattern[m.end():m.end() + 1] in ("?", "*", "{"):
+        word = word[:-1]  # last letter is optional
+    return word.lower()
+
+def literal_first(pattern: str) -> str:
+    """
+    Lowercased `pattern` with its leading \\bword rewritten as word(?<=\\bword): the same
+    matches, but a pattern that starts with a literal gets sre's prefix scanner, which a
+    leading \\b rules out (~10x faster over a long filing).
+    """
+    p = pattern.lower()  # only touches literal letters: the patterns' sole escape is \b
+    lead = lead_literal(pattern)
+    if not lead:
+        return p
+    return f"{lead}(?<=\\b{lead}){p[2 + len(lead):]}"
+
+def keyword_re(pattern: str, payload=None):
+    return (re.compile(literal_first(pattern)), lead_literal(pattern), payload)
+
+DIRECT_KEYWORD_RES  = [keyword_re(p, w) for p, w in DIRECT_KEYWORDS.items()]
+CONTEXT_KEYWORD_RES = [keyword_re(p, w) for p, w in CONTEXT_KEYWORDS.items()]
+PAIR_RULE_RES = [(keyword_re(a), keyword_re(b), w) for a, b, w in PAIR_RULES]
+# A mode only needs any one of its patterns, so each mode is a single alternation
+MODE_TAG_RES = [
+    (label, re.compile("|".join(f"(?:{literal_first(p)})" for p in patterns)))
+    for label, patterns in MODE_TAGS
+]
+
+# Watchlist names as one alternation over the lowercased issuer name: a single scan
+# instead of a lower()+substring test per name
+CORE_FREIGHT_WATCH_RE = re.compile("|".join(re.escape(w.lower()) for w in CORE_FREIGHT_WATCHLIST))
+
+# Excerpt search order is direct, then context, then pair terms. The first two come free
+# from the scoring scans (keyword_scan); this list is only the pair terms left over.
+PAIR_SNIPPET_RES = [keyword_re(p) for p in dict.fromkeys(
+    p for a, b, _w in PAIR_RULES for p in (a, b)
+    if p not in DIRECT_KEYWORDS and p not in CONTEXT_KEYWORDS
+)]
+
 ###############################################################################
 # HELPERS
 ###############################################################################
 
-def weighted_keyword_score(text: str, keyword_dict: dict) -> int:
+def search_keyword(text: str, keyword):
+    """keyword_re tuple's first match in case-folded text, or None; skipped when its lead word is absent."""
+    pattern, lead, _ = keyword
+    i = text.find(lead)
+    return pattern.search(text, i) if i != -1 else None
+
+def keyword_scan(text: str, keyword_res):
+    """
+    (sum of weights of the patterns found anywhere in case-folded text, each counted once;
+    first match of the earliest-listed pattern found, or None).
+    """
+    total, first = 0, None
     if not text:
-        return 0
-    total = 0
-    for pattern, weight in keyword_dict.items():
-        if re.search(pattern, text, flags=re.IGNORECASE):
-            total += weight
-    return total
+        return total, first
+    for keyword in keyword_res:
+        m = search_keyword(text, keyword)
+        if m:
+            total += keyword[2]
+            if first is None:
+                first = m
+    return total, first
+
+def weighted_keyword_score(text: str, keyword_res) -> int:
+    return keyword_scan(text, keyword_res)[0]
 
 def pair_score(text: str, pairs) -> int:
     if not text:
         return 0
     bonus = 0
-    for pat_a, pat_b, weight in pairs:
-        if re.search(pat_a, text, flags=re.IGNORECASE) and re.search(pat_b, text, flags=re.IGNORECASE):
+    for kw_a, kw_b, weight in pairs:
+        if search_keyword(text, kw_a) and search_keyword(text, kw_b):
             bonus += weight
     return bonus
 
+# Issuer-name checks are memoized: one issuer often files several times in a feed window
+@lru_cache(maxsize=4096)
 def is_core_freight_company(name: str) -> bool:
     if not name:
         return False
-    lower = name.lower()
-    for watch in CORE_FREIGHT_WATCHLIST:
-        if watch.lower() in lower:
-            return True
-    return False
+    return CORE_FREIGHT_WATCH_RE.search(name.lower()) is not None
+
+@lru_cache(maxsize=4096)
+def company_direct_score(name: str) -> int:
+    return weighted_keyword_score(fold_case(name), DIRECT_KEYWORD_RES)
 
 def guess_mode_tags(text: str):
     tags = []
     if not text:
         return tags
-    for label, patterns in MODE_TAGS:
-        for p in patterns:
-            if re.search(p, text, flags=re.IGNORECASE):
-                tags.append(label); break
+    for label, pattern in MODE_TAG_RES:
+        if pattern.search(text):
+            tags.append(label)
     # de-dupe, preserve order
     final = []
     for t in tags:
@@ -224,6 +339,9 @@ def guess_mode_tags(text: str):
             final.append(t)
     return final
 
+def hit_sort_key(item):
+    return (-item["score"], FORM_RANK.get(item["form"], 99), str(item.get("filed_at", "")))
+
 def form_signal_adjustment(form_type: str) -> int:
     # 8-K/6-K (+ amended): +1; 10-Q/10-K/20-F (+ amended): 0; S-4: 0; capital-raise & 425: -1
     if form_type in ("8-K", "6-K", "8-K/A", "6-K/A"):
@@ -235,20 +353,25 @@ def form_signal_adjustment(form_type: str) -> int:
         return -1
     return 0
 
-def find_relevant_snippet(text: str, patterns: list[str], window: int = 220) -> str:
+def build_snippet(text: str, m, window: int = 220) -> str:
+    """Excerpt of text around match m (taken on its case-folded copy, same offsets)."""
+    start = max(m.start() - window//2, 0)
+    end = min(m.end() + window//2, len(text))
+    snippet = " ".join(text[start:end].split())  # collapse whitespace runs, trim ends
+    # try to end cleanly at nearest period
+    period_pos = snippet.find(". ")
+    if period_pos != -1 and period_pos < len(snippet) - 20:
+        snippet = snippet[:period_pos+1]
+    return snippet.strip().strip('"').strip("'")
+
+def find_relevant_snippet(text: str, folded: str, patterns, window: int = 220) -> str:
+    """Excerpt around the first pattern (in list order) found in text's case-folded copy."""
     if not text:
         return ""
-    for pat in patterns:
-        m = re.search(pat, text, flags=re.IGNORECASE)
+    for keyword in patterns:
+        m = search_keyword(folded, keyword)
         if m:
-            start = max(m.start() - window//2, 0)
-            end = min(m.end() + window//2, len(text))
-            snippet = re.sub(r"\s+", " ", text[start:end]).strip()
-            # try to end cleanly at nearest period
-            period_pos = snippet.find(". ")
-            if period_pos != -1 and period_pos < len(snippet) - 20:
-                snippet = snippet[:period_pos+1]
-            return snippet.strip().strip('"').strip("'")
+            return build_snippet(text, m, window)
     return ""
 
 def safe_slug(s: str) -> str:
@@ -258,7 +381,8 @@ def safe_slug(s: str) -> str:
     return s.strip("_")[:80]
 
 def tiny_hash(s: str) -> str:
-    return hashlib.sha1(s.encode("utf-8")).hexdigest()[:10]
+    # short filename id, not security: a 5-byte BLAKE2b digest is the same 10 hex chars
+    return hashlib.blake2b(s.encode("utf-8"), digest_size=5).hexdigest()
 
 def summarize_for_newsletter(company, ticker, form, filed_at, url, rationale, tags, snippet, fulltext_path_if_any):
     ts_str = str(filed_at) if filed_at else "unknown date"
@@ -274,6 +398,195 @@ def summarize_for_newsletter(company, ticker, form, filed_at, url, rationale, ta
         lines.append(f"  Full text saved: {fulltext_path_if_any}")
     return "\n".join(lines) + "\n"
 
+# Bump whenever score_filing's inline rules change (boost points, rationale text,
+# candidate fields); the helpers it calls are hashed from their source below.
+SCORING_VERSION = 1
+
+# Entries are dropped whenever the scoring config or code changes
+SCORING_FINGERPRINT = hashlib.blake2b(
+    repr((SCORING_VERSION, DIRECT_KEYWORDS, CONTEXT_KEYWORDS, PAIR_RULES, MODE_TAGS,
+          CORE_FREIGHT_WATCHLIST, FORM_RANK,
+          [inspect.getsource(fn) for fn in (form_signal_adjustment, build_snippet, find_relevant_snippet)],
+          )).encode("utf-8"),
+    digest_size=8,
+).hexdigest()
+
+def filing_cache_key(url: str) -> str:
+    return hashlib.blake2b(url.encode("utf-8"), digest_size=16).hexdigest()
+
+def load_scored_cache() -> dict:
+    """{url key: {"cached_on": ISO date, "cand": candidate minus date_run}}, or {} if unusable."""
+    if SCORED_CACHE_DAYS <= 0 or not os.path.exists(SCORED_CACHE_PATH):
+        return {}
+    try:
+        with open(SCORED_CACHE_PATH, encoding="utf-8") as fh:
+            data = json.load(fh)
+        if data.get("fingerprint") != SCORING_FINGERPRINT:
+            return {}
+        return data.get("entries", {})
+    except Exception:
+        return {}
+
+def save_scored_cache(entries: dict, run_date: str):
+    """Write entries scored within SCORED_CACHE_DAYS of run_date (tmp file + atomic replace)."""
+    if SCORED_CACHE_DAYS <= 0:
+        return
+    cutoff = (datetime.date.fromisoformat(run_date) - datetime.timedelta(days=SCORED_CACHE_DAYS)).isoformat()
+    keep = {k: v for k, v in entries.items() if v.get("cached_on", "") > cutoff}
+    try:
+        os.makedirs(os.path.dirname(SCORED_CACHE_PATH) or ".", exist_ok=True)
+        tmp = SCORED_CACHE_PATH + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"fingerprint": SCORING_FINGERPRINT, "entries": keep}, fh)
+        os.replace(tmp, SCORED_CACHE_PATH)
+    except Exception as e:
+        print(f"[warn] could not save scored-filing cache: {e}", file=sys.stderr)
+
+def fetch_filing_text(f, url: str) -> str:
+    """f.text(), read from / saved to TEXT_CACHE_DIR when enabled (exceptions propagate)."""
+    if not (TEXT_CACHE_DIR and url):
+        return f.text()
+    path = os.path.join(TEXT_CACHE_DIR, filing_cache_key(url) + ".txt")
+    try:
+        with open(path, encoding="utf-8", errors="surrogatepass", newline="") as fh:
+            return fh.read()
+    except OSError:
+        pass
+    text = f.text()
+    if text:
+        try:
+            tmp = f"{path}.{os.getpid()}.{id(text)}.tmp"
+            with open(tmp, "w", encoding="utf-8", errors="surrogatepass", newline="") as fh:
+                fh.write(text)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[warn] could not cache filing text: {e}", file=sys.stderr)
+    return text
+
+# Only names cached_text writes: <filing_cache_key>.txt and its leftover .tmp files.
+# TEXT_CACHE_DIR is user-chosen, so anything else in it is never touched.
+TEXT_CACHE_NAME_RE = re.compile(r"[0-9a-f]{32}\.txt(?:\.\d+\.\d+\.tmp)?")
+
+def prune_text_cache(now_ts: float) -> int:
+    """Delete cached filing texts older than TEXT_CACHE_DAYS; returns how many were removed."""
+    removed = 0
+    cutoff = now_ts - TEXT_CACHE_DAYS * 86400
+    try:
+        with os.scandir(TEXT_CACHE_DIR) as it:
+            for entry in it:
+                if not TEXT_CACHE_NAME_RE.fullmatch(entry.name):
+                    continue
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+    except OSError as e:
+        print(f"[warn] could not prune filing-text cache: {e}", file=sys.stderr)
+    return removed
+
+def score_filing(f, run_date: str, cache: dict, min_filed: str = ""):
+    """
+    Fetch and score one filing → (candidate dict, path of its saved full text or None,
+    new cache entry as (key, value) or None); all three None if it was filed before
+    `min_filed` (ISO date). Runs on the fetch pool's threads and only reads `cache`. A core-form filing at the full-text bar is written out here, so its
+    text (often megabytes) is dropped with the worker's frame instead of being handed
+    back to main().
+    """
+    # ✅ Correct attribute names from edgartools Filing API
+    form = (getattr(f, "form", "") or "").strip()
+    company_name = (getattr(f, "company", "") or "").strip()
+
+    # Safe handling of filing_date, which may be a string or datetime.date
+    _filed = getattr(f, "filing_date", None)
+    if isinstance(_filed, str):
+        filed_at = _filed.strip()
+    elif _filed is None:
+        filed_at = ""
+    else:
+        # datetime.date or datetime.datetime → ISO string
+        try:
+            filed_at = _filed.isoformat()
+        except Exception:
+            filed_at = str(_filed)
+    if min_filed and filed_at and filed_at[:10] < min_filed:
+        return None, None, None
+
+    url = (getattr(f, "filing_url", None) or getattr(f, "url", "") or "").strip()
+
+    # edgar's Filing object typically doesn't have ticker; leave blank (optional lookup is slower)
+    ticker = ""
+
+    cache_key = filing_cache_key(url) if url else None
+    cached = cache.get(cache_key) if cache_key else None
+    if cached is not None:
+        return {"date_run": run_date, **cached["cand"]}, None, None
+
+    fetched = False
+    if FAST_PREFILTER and form not in CORE_FORMS and not is_core_freight_company(company_name):
+        body_text = ""
+    else:
+        try:
+            body_text = fetch_filing_text(f, url)
+            fetched = True
+        except Exception:
+            body_text = ""
+
+    # --- scoring (for ALL filings, even off-form) ---
+    body_lc = fold_case(body_text)  # one lowercase pass shared by the scans below
+    body_direct_pts, direct_hit = keyword_scan(body_lc, DIRECT_KEYWORD_RES)
+    direct_pts  = company_direct_score(company_name) + body_direct_pts
+    context_pts, context_hit = keyword_scan(body_lc, CONTEXT_KEYWORD_RES)
+    combo_pts   = pair_score(body_lc, PAIR_RULE_RES)
+    boost_pts   = 5 if is_core_freight_company(company_name) else 0
+    form_adj    = form_signal_adjustment(form)
+    score       = direct_pts + context_pts + combo_pts + boost_pts + form_adj
+
+    # rationale & tags
+    rationale_bits = []
+    if boost_pts: rationale_bits.append("core transport operator")
+    if direct_pts: rationale_bits.append("direct transport language")
+    if context_pts: rationale_bits.append("macro/sector signal (IP, retail, construction, ports, inputs)")
+    if combo_pts: rationale_bits.append("paired signal (output + transport stress, border + capacity)")
+    rationale = "; ".join(rationale_bits) if rationale_bits else "logistics-adjacent operational signal"
+    modes = guess_mode_tags(body_lc)
+    # excerpt anchor: first direct, else first context hit from the scans above
+    snippet_hit = direct_hit or context_hit
+    snippet = (build_snippet(body_text, snippet_hit) if snippet_hit
+               else find_relevant_snippet(body_text, body_lc, PAIR_SNIPPET_RES))
+
+    cand = {
+        "date_run": run_date,
+        "company": company_name,
+        "ticker": ticker,
+        "form": form,
+        "filed_at": filed_at,
+        "url": url,
+        "rationale": rationale,
+        "tags": modes,
+        "score": score,
+        "snippet": snippet,
+        "direct_pts": direct_pts,
+        "context_pts": context_pts,
+        "combo_pts": combo_pts,
+        "boost_pts": boost_pts,
+        "form_adj": form_adj,
+    }
+    fulltext_path = None
+    if form in CORE_FORMS and score >= FULLTEXT_THRESHOLD:
+        base_pieces = [run_date, form, safe_slug(company_name)[:20] or "issuer"]
+        base_name = "_".join(safe_slug(p) for p in base_pieces if p) + "_" + tiny_hash(url or company_name or "") + ".txt"
+        fulltext_path = os.path.join("output", "full_text", base_name)
+        with open(fulltext_path, "w", encoding="utf-8") as ffull:
+            ffull.write(f"Company: {company_name}\nTicker: {ticker}\nForm: {form}\nFiled At: {filed_at}\nURL: {url}\nScore: {score}\n")
+            ffull.write("\n=== BEGIN FILING TEXT ===\n\n")
+            ffull.write(body_text)
+
+    # Cache only a score from the filing's real text that needs no text to reuse
+    # (prefiltered/failed fetches and saved full texts are redone next run)
+    entry = None
+    if cache_key and fetched and fulltext_path is None:
+        entry = (cache_key, {"cached_on": run_date, "cand": {k: v for k, v in cand.items() if k != "date_run"}})
+    return cand, fulltext_path, entry
+
 ###############################################################################
 # MAIN
 ###############################################################################
@@ -289,114 +602,48 @@ def main():
     os.makedirs("output", exist_ok=True)
     os.makedirs("output/full_text", exist_ok=True)
 
-    # snippet patterns (build once)
-    snippet_patterns = list(DIRECT_KEYWORDS.keys()) + list(CONTEXT_KEYWORDS.keys())
-    for a, b, _w in PAIR_RULES:
-        snippet_patterns.append(a); snippet_patterns.append(b)
-    snippet_patterns = list(dict.fromkeys(snippet_patterns))
-
     total_seen = 0
     total_core_form = 0
 
-    for f in filings:
-        total_seen += 1 # <-- FIX 1: Indented
-
-        # ✅ Correct attribute names from edgartools Filing API
-        form = (getattr(f, "form", "") or "").strip()
-        company_name = (getattr(f, "company", "") or "").strip()
-
-        # Safe handling of filing_date, which may be a string or datetime.date
-        _filed = getattr(f, "filing_date", None)
-        if isinstance(_filed, str):
-            filed_at = _filed.strip()
-        elif _filed is None:
-            filed_at = ""
-        else:
-            # datetime.date or datetime.datetime → ISO string
-            try:
-                filed_at = _filed.isoformat()
-            except Exception:
-                filed_at = str(_filed)
-
-        url = (getattr(f, "filing_url", None) or getattr(f, "url", "") or "").strip()
-
-        # edgar's Filing object typically doesn't have ticker; leave blank (optional lookup is slower)
-        ticker = ""
-
-        try:
-            body_text = f.text()
-        except Exception:
-            body_text = ""
-
-        # FIX 2 & 3: The rest of the loop logic is now correctly indented
-        # --- scoring (for ALL filings, even off-form) ---
-        direct_pts  = weighted_keyword_score(company_name, DIRECT_KEYWORDS) \
-                      + weighted_keyword_score(body_text, DIRECT_KEYWORDS)
-        context_pts = weighted_keyword_score(body_text, CONTEXT_KEYWORDS)
-        combo_pts   = pair_score(body_text, PAIR_RULES)
-        boost_pts   = 5 if is_core_freight_company(company_name) else 0
-        form_adj    = form_signal_adjustment(form)
-        score       = direct_pts + context_pts + combo_pts + boost_pts + form_adj
-
-        # rationale & tags
-        rationale_bits = []
-        if boost_pts: rationale_bits.append("core transport operator")
-        if direct_pts: rationale_bits.append("direct transport language")
-        if context_pts: rationale_bits.append("macro/sector signal (IP, retail, construction, ports, inputs)")
-        if combo_pts: rationale_bits.append("paired signal (output + transport stress, border + capacity)")
-        rationale = "; ".join(rationale_bits) if rationale_bits else "logistics-adjacent operational signal"
-        modes = guess_mode_tags(body_text)
-        snippet = find_relevant_snippet(body_text, snippet_patterns)
-
-        cand = {
-            "date_run": now.date().isoformat(),
-            "company": company_name,
-            "ticker": ticker,
-            "form": form,
-            "filed_at": filed_at,
-            "url": url,
-            "rationale": rationale,
-            "tags": modes,
-            "score": score,
-            "snippet": snippet,
-            "direct_pts": direct_pts,
-            "context_pts": context_pts,
-            "combo_pts": combo_pts,
-            "boost_pts": boost_pts,
-            "form_adj": form_adj,
-        }
-        candidates.append(cand)
-
-        # Only surface "core" forms if they pass the score bar
-        if form in CORE_FORMS:
-            total_core_form += 1
-            if score >= SCORE_THRESHOLD:
-                fulltext_path = None
-                if score >= FULLTEXT_THRESHOLD:
-                    base_pieces = [now.date().isoformat(), form, safe_slug(company_name)[:20] or "issuer"]
-                    base_name = "_".join(safe_slug(p) for p in base_pieces if p) + "_" + tiny_hash(url or company_name or "") + ".txt"
-                    fulltext_path = os.path.join("output", "full_text", base_name)
-                    with open(fulltext_path, "w", encoding="utf-8") as ffull:
-                        ffull.write(f"Company: {company_name}\nTicker: {ticker}\nForm: {form}\nFiled At: {filed_at}\nURL: {url}\nScore: {score}\n")
-                        ffull.write("\n=== BEGIN FILING TEXT ===\n\n")
-                        ffull.write(body_text)
-
-                cand_hit = dict(cand)
-                cand_hit["fulltext_file"] = fulltext_path if fulltext_path else ""
-                hits.append(cand_hit)
+    run_date = now.date().isoformat()
+    scored_cache = load_scored_cache()
+    new_entries = {}
+    min_filed = ((now.date() - datetime.timedelta(days=MAX_FILING_AGE_DAYS)).isoformat()
+                 if MAX_FILING_AGE_DAYS > 0 else "")
+    total_stale = 0
+    if TEXT_CACHE_DIR:
+        os.makedirs(TEXT_CACHE_DIR, exist_ok=True)
+    # f.text() is a network fetch, so filings are fetched and scored FETCH_WORKERS at a
+    # time; map() yields in feed order, so candidates and hits keep the serial order
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as ex:
+        for cand, fulltext_path, entry in ex.map(lambda f: score_filing(f, run_date, scored_cache, min_filed), filings):
+            if cand is None:
+                total_stale += 1
+                continue
+            total_seen += 1
+            candidates.append(cand)
+            if entry:
+                new_entries[entry[0]] = entry[1]
+
+            # Only surface "core" forms if they pass the score bar
+            if cand["form"] in CORE_FORMS:
+                total_core_form += 1
+                if cand["score"] >= SCORE_THRESHOLD:
+                    cand_hit = dict(cand)
+                    cand_hit["fulltext_file"] = fulltext_path if fulltext_path else ""
+                    hits.append(cand_hit)
+
+    if SCORED_CACHE_DAYS > 0:
+        if new_entries:
+            save_scored_cache({**scored_cache, **new_entries}, run_date)
+        print(f"[debug] scored-filing cache: {len(scored_cache)} loaded, {len(new_entries)} added")
+    if TEXT_CACHE_DIR:
+        print(f"[debug] filing-text cache: pruned {prune_text_cache(now.timestamp())} older than {TEXT_CACHE_DAYS}d")
+    if min_filed:
+        print(f"[debug] skipped {total_stale} filings filed before {min_filed}")
 
     # Sort surfaced hits (filing_date is already ISO; lexical sort works)
-    form_rank = {
-        "8-K": 1, "6-K": 1, "8-K/A": 1, "6-K/A": 1,
-        "10-Q": 2, "10-K": 2, "20-F": 2, "10-Q/A": 2, "10-K/A": 2, "20-F/A": 2,
-        "S-4": 3, "S-4/A": 3,
-        "424B": 4, "424B1": 4, "424B2": 4, "424B3": 4, "424B4": 4, "424B5": 4,
-        "FWP": 4, "S-1": 4, "S-1/A": 4, "S-3": 4, "S-3/A": 4, "425": 4,
-    }
-    def sort_key(item):
-        filed_str = str(item.get("filed_at", ""))
-        return (-item["score"], form_rank.get(item["form"], 99), filed_str)
-    hits.sort(key=sort_key)
+    hits.sort(key=hit_sort_key)
 
     # Report
     bullet_blocks.append("🔎 SEC Filings With Freight / Supply Chain Impact (recent feed)\n")
@@ -405,18 +652,10 @@ def main():
         bullet_blocks.append("• No high-signal core forms matched the freight/macro criteria above.\n")
 
         # === Recall Floor: Top-5 near-misses from ALL forms ===
-        generic_pat = re.compile(r"\b(supply|inventory|production|capacity|port|logistics|warehouse|CapEx|construction|PMI|ISM|retail)\b", re.I)
-        near = []
-        for c in candidates:
-            text_for_check = " ".join([
-                c.get("snippet") or "",
-                c.get("rationale") or "",
-                c.get("company") or ""
-            ])
-            if c["score"] >= 1 or generic_pat.search(text_for_check):
-                near.append(c)
-        near.sort(key=lambda x: -x["score"])
-        near = near[:5]
+        # Every candidate qualifies: a rationale without a direct or issuer bit always
+        # names a generic freight term ("logistics-adjacent", "retail", "capacity"),
+        # and either of those bits alone puts the score at 1 or more
+        near = sorted(candidates, key=lambda x: -x["score"])[:5]
         if near:
             bullet_blocks.append("🔁 Recall floor — notable near-misses (manual review suggested):\n")
             for c in near:
@@ -450,16 +689,19 @@ def main():
     # Quick debug: forms we actually saw
     unique_forms = sorted({c["form"] for c in candidates if c["form"]})
     print(f"[debug] forms_seen={len(unique_forms)} sample={unique_forms[:12]}")
+    print(f"[debug] issuer memo: watchlist {is_core_freight_company.cache_info()}, "
+          f"name score {company_direct_score.cache_info()}")
 
     # Write outputs
+    report = "\n".join(bullet_blocks)  # joined once for both the file and the log echo
     with open("output/freight_pulse_sec_raw.txt", "w", encoding="utf-8") as ftxt:
-        ftxt.write("\n".join(bullet_blocks))
+        ftxt.write(report)
 
     csv_path = "output/freight_pulse_sec_full.csv"
-    new_file = not os.path.exists(csv_path)
-    with open(csv_path, "a", newline="", encoding="utf-8") as fcsv:
+    # One writerows() call through a 64 KiB buffer rather than a writerow() per hit
+    with open(csv_path, "a", newline="", encoding="utf-8", buffering=1 << 16) as fcsv:
         writer = csv.writer(fcsv)
-        if new_file:
+        if fcsv.tell() == 0:  # append mode opens at EOF, so 0 means a new/empty log
             writer.writerow([
                 "date_run","company","ticker","form","filed_at","score",
                 "rationale","mode_tags","snippet","url","fulltext_file",
@@ -467,15 +709,15 @@ def main():
             ])
         # Always log surfaced hits; if none, log recall-floor near-misses
         rows = hits if hits else (near if 'near' in locals() else [])
-        for h in rows:
-            writer.writerow([
-                now.date().isoformat(), h["company"], h["ticker"], h["form"], h["filed_at"], h["score"],
-                h["rationale"], "; ".join(h["tags"]), h["snippet"], h["url"], h.get("fulltext_file",""),
-                h["direct_pts"], h["context_pts"], h["combo_pts"], h["boost_pts"], h["form_adj"]
-            ])
+        writer.writerows(
+            (run_date, h["company"], h["ticker"], h["form"], h["filed_at"], h["score"],
+             h["rationale"], "; ".join(h["tags"]), h["snippet"], h["url"], h.get("fulltext_file",""),
+             h["direct_pts"], h["context_pts"], h["combo_pts"], h["boost_pts"], h["form_adj"])
+            for h in rows
+        )
 
     # Echo to Actions logs
-    print("\n".join(bullet_blocks))
+    print(report)
 
 if __name__ == "__main__":
     main()